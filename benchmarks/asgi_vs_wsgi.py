@@ -0,0 +1,79 @@
+"""Compare the synchronous API under WSGI with the async read path under ASGI.
+
+Both servers run the same number of worker processes against the configured
+database, without the catalog cache, which only the synchronous API uses.
+Run from the project root, e.g.::
+
+    python -m benchmarks.asgi_vs_wsgi --token <key> --workers 4 --concurrency 1 16 64
+
+Requires gunicorn and uvicorn (see requirements.txt).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.load import run_load
+from benchmarks.server import serve
+
+SERVERS = {
+    "wsgi": (
+        ["gunicorn", "library.wsgi:application", "--workers", "{workers}"]
+        + ["--bind", "127.0.0.1:{port}", "--log-level", "warning"],
+        "",
+    ),
+    "asgi": (
+        ["uvicorn", "library.asgi:application", "--workers", "{workers}"]
+        + ["--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+        "/async",
+    ),
+}
+PATHS = ("/books/", "/books/?search=data", "/books/1/", "/books/1/related/", "/tags/")
+
+
+def benchmark(mode, args):
+    command, prefix = SERVERS[mode]
+    command = [part.format(workers=args.workers, port="{port}") for part in command]
+    requests = [("GET", prefix + path, None) for path in args.paths]
+    headers = {"Authorization": f"Token {args.token}"}
+    with serve(command, DJANGO_SETTINGS_MODULE=args.settings) as base_url:
+        run_load(base_url, requests, args.workers, args.warmup, headers)
+        return {
+            concurrency: run_load(
+                base_url, requests, concurrency, args.duration, headers
+            )
+            for concurrency in args.concurrency
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--token", required=True, help="API token of a library user.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--paths", nargs="+", default=PATHS)
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    parser.add_argument("--settings", default="benchmarks.uncached_settings")
+    args = parser.parse_args()
+    os.environ["DJANGO_SETTINGS_MODULE"] = args.settings
+
+    results = {mode: benchmark(mode, args) for mode in SERVERS}
+    print(
+        f"{'mode':<6}{'conc.':>7}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    )
+    for mode, runs in results.items():
+        for concurrency, stats in runs.items():
+            print(
+                f"{mode:<6}{concurrency:>7}{stats['throughput']:>10.1f}"
+                f"{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['errors']:>8}"
+            )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""Benchmark every router endpoint at a fixed concurrency, against a baseline.
+
+Generate a dataset first (``python manage.py generate_library``), then run
+from the project root::
+
+    python -m benchmarks.http_suite --update-baseline benchmarks/baseline.json
+    python -m benchmarks.http_suite --baseline benchmarks/baseline.json
+
+The server is started with gunicorn, as a single process with one thread per
+concurrent client, so that the query counts read from ``/metrics`` cover every
+request. The command exits with status 1 when a scenario regresses past the
+threshold.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+from collections import Counter
+
+from benchmarks.load import Client, run_flow
+from benchmarks.server import serve
+
+MANAGER_PERMISSIONS = (
+    "change_borrow",
+    "view_borrow",
+    "add_tag",
+    "change_tag",
+    "delete_tag",
+    "view_tag",
+    "add_book",
+    "change_book",
+    "delete_book",
+    "view_book",
+    "change_delaypenalty",
+    "view_delaypenalty",
+)
+STUDENT_PERMISSIONS = (
+    "add_borrow",
+    "view_borrow",
+    "view_tag",
+    "view_book",
+    "view_delaypenalty",
+)
+# Books created by the suite, deleted once it is done.
+ISBN_PREFIX = "977"
+QUERIES = re.compile(r'^library_db_queries_(sum|count)\{.*route="([^"]+)"\} (\S+)$')
+
+
+def prepare(concurrency):
+    """Give the suite a manager and one idle student per client, with their tokens."""
+    from django.contrib.auth.models import Group, Permission, User
+    from django.db.models import F
+    from django.utils import timezone
+    from rest_framework.authtoken.models import Token
+
+    from library.books.models import Book, Borrow, DelayPenalty, StudentStanding
+
+    def member(username, group, codenames):
+        group, created = Group.objects.get_or_create(name=group)
+        group.permissions.add(*Permission.objects.filter(codename__in=codenames))
+        user, created = User.objects.get_or_create(username=username)
+        user.groups.add(group)
+        return Token.objects.get_or_create(user=user)[0].key
+
+    manager = member("benchmark-manager", "Manager", MANAGER_PERMISSIONS)
+    students = [
+        member(f"benchmark-student-{worker}", "Student", STUDENT_PERMISSIONS)
+        for worker in range(concurrency)
+    ]
+    # Leave the students free to borrow, even after an interrupted run.
+    for borrow in Borrow.objects.open().filter(
+        student__username__startswith="benchmark-student-"
+    ):
+        borrow.borrowed_at = borrow.borrowed_at or timezone.now()
+        borrow.duration = borrow.duration or 14
+        borrow.returned_at = timezone.now()
+        borrow.save()
+    DelayPenalty.objects.filter(
+        borrow__student__username__startswith="benchmark-student-"
+    ).update(is_paid=True)
+    StudentStanding.objects.reconcile(
+        User.objects.filter(username__startswith="benchmark-student-").values_list(
+            "pk", flat=True
+        )
+    )
+    Book.objects.filter(isbn__startswith=ISBN_PREFIX).delete()
+
+    generator = random.Random(0)
+    last = Book.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    book_ids = list(
+        Book.objects.filter(
+            pk__in=[generator.randint(1, last) for index in range(1000)]
+        ).values_list("pk", flat=True)[:100]
+    )
+    titles = Book.objects.filter(pk__in=book_ids).values_list("title", flat=True)
+    words = Counter(word for title in titles for word in title.split() if len(word) > 3)
+    free_books = list(
+        Book.objects.alias(free=F("copies") - F("out_copies"))
+        .filter(free__gte=concurrency)
+        .order_by("-free")
+        .values_list("pk", flat=True)[:50]
+    )
+    if not book_ids or not free_books:
+        raise SystemExit("Generate a dataset first: python manage.py generate_library")
+    return {
+        "manager": manager,
+        "students": students,
+        "book_ids": book_ids,
+        "words": [word for word, count in words.most_common(50)],
+        "free_books": free_books,
+    }
+
+
+def scenarios(data):
+    """Map scenario names to ``flow(client, worker)`` callables."""
+    manager = {"Authorization": f"Token {data['manager']}"}
+    generators = {}
+    created = Counter()
+
+    def pick(worker, items):
+        generator = generators.setdefault(worker, random.Random(worker))
+        return generator.choice(items)
+
+    def get(path):
+        def flow(client, worker):
+            client.request("GET", path(worker), headers=manager)
+
+        return flow
+
+    def create_book(client, worker):
+        created[worker] += 1
+        number = f"{worker:03d}{created[worker]:07d}"
+        client.request(
+            "POST",
+            "/books/",
+            {
+                "title": f"Benchmark {number}",
+                "isbn": f"{ISBN_PREFIX}{number}",
+                "authors": "Benchmark",
+                "type": "O",
+                "copies": 1,
+                "tags": [],
+            },
+            headers=manager,
+        )
+
+    def borrow(client, worker):
+        student = {"Authorization": f"Token {data['students'][worker]}"}
+        book = pick(worker, data["free_books"])
+        status, borrow = client.request(
+            "POST", "/borrows/", {"book": book}, headers=student
+        )
+        if status != 201:
+            return
+        path = f"/borrows/{borrow['id']}"
+        client.request("POST", f"{path}/start/", {"duration": 14}, headers=manager)
+        client.request("POST", f"{path}/terminate/", headers=manager)
+
+    offsets = [0, 20, 100, 1000]
+    return {
+        "books-list": get(lambda worker: f"/books/?offset={pick(worker, offsets)}"),
+        "books-detail": get(lambda worker: f"/books/{pick(worker, data['book_ids'])}/"),
+        "books-search": get(
+            lambda worker: f"/books/?search={pick(worker, data['words'])}"
+        ),
+        "books-filter": get(lambda worker: "/books/?type__in=T,O"),
+        "books-related": get(
+            lambda worker: f"/books/{pick(worker, data['book_ids'])}/related/"
+        ),
+        "books-create": create_book,
+        "tags-list": get(lambda worker: "/tags/"),
+        "borrows-list": get(lambda worker: "/borrows/?cursor="),
+        "delay-penalties-list": get(lambda worker: "/delay-penalties/?is_paid=false"),
+        "borrows-flow": borrow,
+    }
+
+
+def query_totals(base_url):
+    """Total SQL queries and requests per route, as reported by ``/metrics``."""
+    client = Client(base_url)
+    client.connection.request("GET", "/metrics")
+    text = client.connection.getresponse().read().decode()
+    client.close()
+    totals = Counter()
+    for line in text.splitlines():
+        match = QUERIES.match(line)
+        if match and match.group(2) != "metrics":
+            totals[match.group(1)] += float(match.group(3))
+    return totals
+
+
+def run(args):
+    os.environ["DJANGO_SETTINGS_MODULE"] = args.settings
+    import django
+
+    django.setup()
+    data = prepare(args.concurrency)
+    command = [
+        "gunicorn",
+        "library.wsgi:application",
+        "--worker-class",
+        "gthread",
+        "--workers",
+        "1",
+        "--threads",
+        str(args.concurrency),
+        "--bind",
+        "127.0.0.1:{port}",
+        "--log-level",
+        "warning",
+    ]
+    flows = scenarios(data)
+    results = {}
+    with serve(command, DJANGO_SETTINGS_MODULE=args.settings) as base_url:
+        for name in args.scenarios or flows:
+            run_flow(base_url, flows[name], args.concurrency, args.warmup)
+            before = query_totals(base_url)
+            result = run_flow(base_url, flows[name], args.concurrency, args.duration)
+            after = query_totals(base_url)
+            requests = after["count"] - before["count"]
+            result["queries_per_request"] = (
+                (after["sum"] - before["sum"]) / requests if requests else None
+            )
+            results[name] = result
+            print(
+                f"{name:<22}{result['throughput']:>9.1f}{result['p50_ms']:>9.1f}"
+                f"{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                f"{result['queries_per_request'] or 0:>9.1f}{result['errors']:>8}"
+            )
+    from library.books.models import Book
+
+    Book.objects.filter(isbn__startswith=ISBN_PREFIX).delete()
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """Describe every scenario which got slower or heavier than its baseline.
+
+    Query counts get half a query of slack, as cache hits make them vary a bit.
+    """
+    found = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        checks = (
+            (
+                "throughput",
+                result["throughput"] < expected["throughput"] * (1 - threshold),
+            ),
+            ("p95_ms", result["p95_ms"] > expected["p95_ms"] * (1 + threshold)),
+            (
+                "queries_per_request",
+                (result["queries_per_request"] or 0)
+                > (expected["queries_per_request"] or 0) * (1 + threshold) + 0.5,
+            ),
+        )
+        for metric, regressed in checks:
+            if regressed:
+                found.append(
+                    f"{name}: {metric} went from {expected[metric]:.1f} "
+                    f"to {result[metric]:.1f}"
+                )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--settings", default="benchmarks.settings")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--scenarios", nargs="+", help="Only run these scenarios.")
+    parser.add_argument("--baseline", help="Compare the results to this JSON file.")
+    parser.add_argument(
+        "--update-baseline", metavar="PATH", help="Write the results to this JSON file."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Tolerated relative regression (default: 0.2).",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'scenario':<22}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'queries':>9}{'errors':>8}"
+    )
+    results = run(args)
+    if args.update_baseline:
+        with open(args.update_baseline, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(results, json.load(file), args.threshold)
+        for regression in found:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
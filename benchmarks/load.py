@@ -0,0 +1,114 @@
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else None,
+        "p50_ms": (percentile(latencies, 0.5) or 0) * 1000,
+        "p95_ms": (percentile(latencies, 0.95) or 0) * 1000,
+        "p99_ms": (percentile(latencies, 0.99) or 0) * 1000,
+    }
+
+
+class Client:
+    """Keep-alive HTTP client recording the latency of successful requests."""
+
+    def __init__(self, base_url, headers=None):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port
+        self.headers = dict(headers or {})
+        self.latencies = []
+        self.errors = 0
+        self.connection = self.connect()
+
+    def connect(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+    def request(self, method, path, data=None, headers=None):
+        """Send a request, returning its status and decoded JSON body (if any)."""
+        headers = {**self.headers, **(headers or {})}
+        body = None
+        if data is not None:
+            body = json.dumps(data)
+            headers["Content-Type"] = "application/json"
+        started = time.monotonic()
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.errors += 1
+            self.connection.close()
+            self.connection = self.connect()
+            return None, None
+        if response.status >= 400:
+            self.errors += 1
+        else:
+            self.latencies.append(time.monotonic() - started)
+        if response.getheader("Content-Type", "").startswith("application/json"):
+            return response.status, json.loads(content)
+        return response.status, None
+
+    def close(self):
+        self.connection.close()
+
+
+def run_flow(base_url, flow, concurrency, duration, headers=None):
+    """Run ``flow(client, worker)`` in a loop on ``concurrency`` threads for ``duration`` seconds.
+
+    Returns throughput and latency percentiles of all the requests made.
+    """
+    deadline = time.monotonic() + duration
+    clients = [Client(base_url, headers) for worker in range(concurrency)]
+
+    def work(worker):
+        while time.monotonic() < deadline:
+            flow(clients[worker], worker)
+
+    started = time.monotonic()
+    threads = [
+        threading.Thread(target=work, args=(worker,)) for worker in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    for client in clients:
+        client.close()
+    return summarize(
+        [latency for client in clients for latency in client.latencies],
+        sum(client.errors for client in clients),
+        elapsed,
+    )
+
+
+def run_load(base_url, requests, concurrency, duration, headers=None):
+    """Keep ``concurrency`` keep-alive connections busy for ``duration`` seconds.
+
+    ``requests`` is a list of ``(method, path, body)`` tuples which every
+    connection goes through in turn.
+    """
+    positions = list(range(concurrency))
+
+    def flow(client, worker):
+        method, path, body = requests[positions[worker] % len(requests)]
+        positions[worker] += 1
+        client.request(method, path, body)
+
+    return run_flow(base_url, flow, concurrency, duration, headers)
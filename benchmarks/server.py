@@ -0,0 +1,40 @@
+import os
+import signal
+import socket
+import subprocess
+import time
+from contextlib import contextmanager
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+@contextmanager
+def serve(command, **environ):
+    """Run the server ``command`` on a free port, yielding its base URL.
+
+    ``{port}`` placeholders of the command are replaced by the chosen port.
+    """
+    port = free_port()
+    command = [part.format(port=port) for part in command]
+    server = subprocess.Popen(command, env={**os.environ, **environ})
+    try:
+        wait_until_ready(port)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
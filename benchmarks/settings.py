@@ -0,0 +1,19 @@
+"""Settings of the benchmarked server: the project settings with metrics enabled.
+
+Point ``--settings`` of the suite to a module like this one to benchmark
+another database, e.g. PostgreSQL.
+"""
+
+import django
+
+from library.settings import *  # noqa: F401,F403
+from library.settings import DATABASES
+
+METRICS_ENABLED = True
+
+# Concurrent write flows fail with "database is locked" when sqlite upgrades a
+# read transaction to a write one, so take the write lock up front.
+if DATABASES["default"]["ENGINE"].endswith("sqlite3") and django.VERSION >= (5, 1):
+    DATABASES["default"].setdefault("OPTIONS", {}).update(
+        transaction_mode="IMMEDIATE", timeout=20
+    )
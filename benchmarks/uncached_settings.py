@@ -0,0 +1,13 @@
+"""Settings of the ASGI/WSGI comparison: the project settings without the catalog cache.
+
+The async read path does not use the catalog cache, so the synchronous API
+is measured without it as well.
+"""
+
+from library.settings import *  # noqa: F401,F403
+from library.settings import CACHES, CATALOG_CACHE
+
+CACHES = {
+    **CACHES,
+    CATALOG_CACHE: {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
@@ -0,0 +1,86 @@
+"""Time the values() rendering of book and borrow lists against their model serializers.
+
+Generate a dataset first (``python manage.py generate_library``), then run
+from the project root::
+
+    python -m benchmarks.values_serializers --rows 1000 --repeat 5
+
+Both paths read and render the same first ``--rows`` rows; the best of
+``--repeat`` runs of each is printed.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+
+def cases(rows):
+    from library.books.models import Book, Borrow
+    from library.books.serializers import (
+        BookSerializer,
+        BookValuesSerializer,
+        BorrowSerializer,
+        BorrowValuesSerializer,
+    )
+
+    return {
+        "books": (
+            BookSerializer,
+            BookValuesSerializer,
+            Book.objects.prefetch_related("tags").order_by("pk")[:rows],
+        ),
+        "borrows": (
+            BorrowSerializer,
+            BorrowValuesSerializer,
+            Borrow.objects.order_by("pk")[:rows],
+        ),
+    }
+
+
+def run(args):
+    os.environ["DJANGO_SETTINGS_MODULE"] = args.settings
+    import django
+
+    django.setup()
+    from rest_framework.renderers import JSONRenderer
+
+    renderer = JSONRenderer()
+    results = {}
+    for name, (serializer_class, values_serializer_class, queryset) in cases(
+        args.rows
+    ).items():
+
+        def serialize():
+            return renderer.render(serializer_class(queryset.all(), many=True).data)
+
+        def serialize_values():
+            serializer = values_serializer_class()
+            rows = list(queryset.values(*serializer.columns))
+            return renderer.render(serializer.to_representation(rows))
+
+        if serialize() != serialize_values():
+            raise SystemExit(f"{name}: the values() rendering differs")
+        results[name] = [
+            min(timeit.repeat(function, number=1, repeat=args.repeat)) * 1000
+            for function in (serialize, serialize_values)
+        ]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--settings", default="library.settings")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'list':<10}{'model ms':>10}{'values ms':>11}{'speedup':>9}")
+    for name, (model_ms, values_ms) in run(args).items():
+        print(
+            f"{name:<10}{model_ms:>10.1f}{values_ms:>11.1f}{model_ms / values_ms:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
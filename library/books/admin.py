@@ -1,6 +1,18 @@
 from django.contrib import admin
 
 from library.books.models import Tag, Book, Borrow, DelayPenalty
+from library.books.pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist whose cost does not grow with the size of the table.
+
+    Counts are estimated past a few thousand rows and the date hierarchy
+    only reads the bounds of its (indexed) field.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Tag)
@@ -9,23 +21,26 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(LargeTableAdmin):
     list_display = ("title", "isbn", "authors")
     list_filter = ("type", "tags")
     search_fields = ("title", "isbn", "authors")
 
 
 @admin.register(Borrow)
-class BorrowAdmin(admin.ModelAdmin):
+class BorrowAdmin(LargeTableAdmin):
     list_display = ("book", "student", "requested_at", "borrowed_at", "returned_at")
-    list_filter = ("requested_at", "borrowed_at")
+    list_select_related = ("book", "student")
+    list_filter = (("returned_at", admin.EmptyFieldListFilter),)
+    date_hierarchy = "requested_at"
     search_fields = ("book__title", "book__isbn", "student__username")
     raw_id_fields = ("book", "student")
 
 
 @admin.register(DelayPenalty)
-class DelayPenaltyAdmin(admin.ModelAdmin):
+class DelayPenaltyAdmin(LargeTableAdmin):
     list_display = ("borrow", "amount", "is_paid")
+    list_select_related = ("borrow__book", "borrow__student")
     list_filter = ("is_paid",)
     search_fields = (
         "borrow__book__title",
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BooksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "library.books"
+
+    def ready(self):
+        from library.books import checks, signals  # noqa: F401
@@ -0,0 +1,94 @@
+import calendar
+import time
+
+from django.db import transaction
+from django.db.models import F, Value
+
+from library.books.models import (
+    ArchivedBorrow,
+    ArchivedDelayPenalty,
+    Borrow,
+    DelayPenalty,
+)
+
+FIELDS = (
+    "id",
+    "student",
+    "book",
+    "requested_at",
+    "borrowed_at",
+    "duration",
+    "returned_at",
+)
+COLUMNS = tuple(
+    f"{field}_id" if field in ("student", "book") else field for field in FIELDS
+)
+
+
+def months_before(moment, months):
+    month = moment.month - 1 - months
+    year, month = moment.year + month // 12, month % 12 + 1
+    day = min(moment.day, calendar.monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def archivable(before):
+    """Borrows returned before ``before``, without a penalty left to pay."""
+    return Borrow.objects.filter(returned_at__lt=before).exclude(
+        delaypenalty__is_paid=False
+    )
+
+
+def archive_borrows(before, batch_size=1000, pause=0, limit=None):
+    """Move borrows returned before ``before``, with their penalties, to the archive.
+
+    Borrows are moved by primary key in batches, each in a transaction of its
+    own, so the job can be stopped and run again at any time. ``pause``
+    seconds are waited between batches to leave room to the live traffic.
+    Returns the number of archived borrows and penalties.
+    """
+    borrows = archivable(before).order_by("pk")
+    archived = penalties = last = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        with transaction.atomic():
+            rows = list(
+                borrows.filter(pk__gt=last).select_for_update().values(*COLUMNS)[:size]
+            )
+            if not rows:
+                break
+            ids = [row["id"] for row in rows]
+            charged = DelayPenalty.objects.filter(borrow__in=ids)
+            ArchivedBorrow.objects.bulk_create(ArchivedBorrow(**row) for row in rows)
+            moved = ArchivedDelayPenalty.objects.bulk_create(
+                ArchivedDelayPenalty(**row)
+                for row in charged.values("borrow_id", "amount", "is_paid")
+            )
+            # Raw deletes skip the delete signals: returned borrows and paid
+            # penalties count in no standing or availability, and they are
+            # not gone for feed consumers.
+            charged._raw_delete(charged.db)
+            Borrow.objects.filter(pk__in=ids)._raw_delete(borrows.db)
+        archived += len(rows)
+        penalties += len(moved)
+        last = ids[-1]
+        if pause:
+            time.sleep(pause)
+    return archived, penalties
+
+
+def history(student_id):
+    """Live and archived borrows of a student, newest request first."""
+    live = Borrow.objects.filter(student=student_id).values(
+        *FIELDS,
+        penalty_amount=F("delaypenalty__amount"),
+        penalty_is_paid=F("delaypenalty__is_paid"),
+        archived=Value(False),
+    )
+    archived = ArchivedBorrow.objects.filter(student=student_id).values(
+        *FIELDS,
+        penalty_amount=F("penalty__amount"),
+        penalty_is_paid=F("penalty__is_paid"),
+        archived=Value(True),
+    )
+    return live.union(archived, all=True).order_by("-requested_at", "-id")
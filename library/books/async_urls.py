@@ -0,0 +1,11 @@
+from django.urls import path
+
+from library.books import async_views
+
+urlpatterns = [
+    path("books/", async_views.book_list, name="books-list"),
+    path("books/<int:pk>/", async_views.book_detail, name="books-detail"),
+    path("books/<int:pk>/related/", async_views.related_books, name="books-related"),
+    path("tags/", async_views.tag_list, name="tags-list"),
+    path("borrows/feed/", async_views.borrow_feed, name="borrows-feed"),
+]
@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django_filters.utils import translate_validation
+from rest_framework.exceptions import NotAuthenticated, NotFound, ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from library.books import feed
+from library.books.filters import BookFilterSet
+from library.books.authentication import aauthenticate_token
+from library.books.models import Book, Tag
+from library.books.search import get_search_backend
+from library.books.serializers import (
+    BookSerializer,
+    BorrowFeedSerializer,
+    TagSerializer,
+)
+
+
+async def get_user(request):
+    header = request.headers.get("Authorization", "").split()
+    if len(header) == 2 and header[0] == "Token":
+        return await aauthenticate_token(header[1])
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user if is_authenticated else None
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={"ensure_ascii": False})
+
+
+def error(exception):
+    return json_response({"detail": exception.default_detail}, exception.status_code)
+
+
+def limit_and_offset(request):
+    limit = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    offset = 0
+    try:
+        limit = max(int(request.GET.get("limit", limit)), 1)
+        offset = max(int(request.GET.get("offset", offset)), 0)
+    except ValueError:
+        pass
+    return limit, offset
+
+
+async def paginated(request, queryset, serializer_class):
+    """Limit/offset page shaped like the responses of ``LibraryPagination``."""
+    limit, offset = limit_and_offset(request)
+    with_count = request.GET.get("count", "").lower() not in ("false", "0", "no")
+    if with_count:
+        count = await queryset.acount()
+        results = [item async for item in queryset[offset : offset + limit]]
+        has_more = offset + limit < count
+    else:
+        count = None
+        results = [item async for item in queryset[offset : offset + limit + 1]]
+        has_more = len(results) > limit
+        results = results[:limit]
+    url = request.build_absolute_uri()
+    url = replace_query_param(url, "limit", limit)
+    next_link = previous_link = None
+    if has_more:
+        next_link = replace_query_param(url, "offset", offset + limit)
+    if offset > 0:
+        previous_link = (
+            replace_query_param(url, "offset", offset - limit)
+            if offset - limit > 0
+            else remove_query_param(url, "offset")
+        )
+    return json_response(
+        {
+            "count": count,
+            "next": next_link,
+            "previous": previous_link,
+            "results": serializer_class(results, many=True).data,
+        }
+    )
+
+
+def filter_books(request, queryset):
+    """Filter ``queryset`` like ``BookViewSet``, raising ``ValidationError`` on bad filters."""
+    filterset = BookFilterSet(request.GET, queryset=queryset, request=request)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    queryset = filterset.qs
+    search = request.GET.get("search", "").strip()
+    if search:
+        queryset = get_search_backend().search(queryset, search)
+    return queryset
+
+
+async def book_list(request):
+    if not await get_user(request):
+        return error(NotAuthenticated)
+    queryset = Book.objects.prefetch_related("tags").order_by("pk")
+    try:
+        queryset = filter_books(request, queryset)
+    except ValidationError as exc:
+        return json_response(exc.detail, exc.status_code)
+    return await paginated(request, queryset, BookSerializer)
+
+
+async def book_detail(request, pk):
+    if not await get_user(request):
+        return error(NotAuthenticated)
+    book = await Book.objects.prefetch_related("tags").filter(pk=pk).afirst()
+    if book is None:
+        return error(NotFound)
+    return json_response(BookSerializer(book).data)
+
+
+async def related_books(request, pk):
+    if not await get_user(request):
+        return error(NotAuthenticated)
+    book = await Book.objects.filter(pk=pk).afirst()
+    if book is None:
+        return error(NotFound)
+    queryset = book.related_books.prefetch_related("tags")
+    return await paginated(request, queryset, BookSerializer)
+
+
+async def tag_list(request):
+    if not await get_user(request):
+        return error(NotAuthenticated)
+    return await paginated(request, Tag.objects.order_by("pk"), TagSerializer)
+
+
+async def borrow_feed(request):
+    """Borrow feed holding the request up to ``wait`` seconds until an event comes.
+
+    Waiting only costs a coroutine here, whereas the synchronous feed would
+    hold a worker thread for as long.
+    """
+    user = await get_user(request)
+    if not user:
+        return error(NotAuthenticated)
+    params = BorrowFeedSerializer(data=request.GET)
+    if not params.is_valid():
+        return json_response(params.errors, 400)
+    after, limit, wait = (
+        params.validated_data[name] for name in ("after", "limit", "wait")
+    )
+    student = None
+    if not await sync_to_async(user.has_perm)("books.change_borrow"):
+        student = user.pk
+    deadline = time.monotonic() + wait
+    while True:
+        events = await sync_to_async(feed.read)(after, limit, student)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            break
+        await asyncio.sleep(min(remaining, settings.BORROW_FEED_POLL_INTERVAL))
+    return json_response(feed.page(request.build_absolute_uri(), after, events))
@@ -0,0 +1,87 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def get_cache():
+    return caches[settings.AUTH_CACHE]
+
+
+def get_timeout(timeout):
+    """Cache ``timeout``, shortened when revocations cannot reach other processes."""
+    if isinstance(get_cache(), LocMemCache):
+        return min(timeout, settings.AUTH_LOCAL_CACHE_TIMEOUT)
+    return timeout
+
+
+def token_key(key):
+    return f"auth:token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def permissions_key(user_id):
+    return f"auth:permissions:{user_id}"
+
+
+def forget_tokens(keys):
+    get_cache().delete_many([token_key(key) for key in keys])
+
+
+def forget_permissions(user_ids):
+    get_cache().delete_many([permissions_key(user_id) for user_id in user_ids])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication remembering each token, with its owner, for a short while."""
+
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        token = cache.get(token_key(key))
+        if token is None:
+            user, token = super(
+                CachedTokenAuthentication, self
+            ).authenticate_credentials(key)
+            cache.set(
+                token_key(key), token, get_timeout(settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            )
+        return token.user, token
+
+
+class CachedPermissionBackend(ModelBackend):
+    """Model backend sharing the permission set of each user through the cache."""
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            cache = get_cache()
+            permissions = cache.get(permissions_key(user_obj.pk))
+            if permissions is None:
+                permissions = super(CachedPermissionBackend, self).get_all_permissions(
+                    user_obj
+                )
+                cache.set(
+                    permissions_key(user_obj.pk),
+                    permissions,
+                    get_timeout(settings.AUTH_PERMISSIONS_CACHE_TIMEOUT),
+                )
+            user_obj._perm_cache = permissions
+        return user_obj._perm_cache
+
+
+async def aauthenticate_token(key):
+    """Async counterpart of ``CachedTokenAuthentication``, returning ``None`` for bad tokens."""
+    cache = get_cache()
+    token = await cache.aget(token_key(key))
+    if token is None:
+        token = await Token.objects.select_related("user").filter(key=key).afirst()
+        if token is None or not token.user.is_active:
+            return None
+        await cache.aset(
+            token_key(key), token, get_timeout(settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        )
+    return token.user
@@ -0,0 +1,78 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+BOOKS = "books"
+TAGS = "tags"
+# Responses selected by availability (e.g. lists filtered on it), the only ones
+# dropped when copies are taken or released.
+AVAILABILITY = "availability"
+DEPENDENCIES = {
+    AVAILABILITY: (AVAILABILITY,),
+    BOOKS: (BOOKS, AVAILABILITY),
+    TAGS: (TAGS, BOOKS, AVAILABILITY),
+}
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE]
+
+
+def _generation_key(namespace):
+    return f"catalog:{namespace}:generation"
+
+
+def generation(namespace):
+    cache = get_cache()
+    key = _generation_key(namespace)
+    value = cache.get(key)
+    if value is None:
+        # Start from the clock, so that an evicted counter never comes back to a
+        # value which is still used by cached responses.
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+    return value
+
+
+def _bump(namespaces):
+    cache = get_cache()
+    for namespace in namespaces:
+        try:
+            cache.incr(_generation_key(namespace))
+        except ValueError:
+            generation(namespace)
+
+
+def invalidate(namespace):
+    """Bump the generations depending on ``namespace``, now and once the transaction commits."""
+    namespaces = DEPENDENCIES[namespace]
+    _bump(namespaces)
+    transaction.on_commit(lambda: _bump(namespaces))
+
+
+def response_key(namespace, url, language, renderer_format):
+    """Key of the response to ``url``, translated to ``language`` and rendered as ``renderer_format``."""
+    variant = f"{url}|{language}|{renderer_format}"
+    digest = hashlib.md5(variant.encode()).hexdigest()
+    return f"catalog:{namespace}:{generation(namespace)}:{digest}"
+
+
+def record(outcome):
+    cache = get_cache()
+    key = f"catalog:stats:{outcome}"
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def stats():
+    cache = get_cache()
+    return {
+        outcome: cache.get(f"catalog:stats:{outcome}", 0)
+        for outcome in ("hits", "misses")
+    }
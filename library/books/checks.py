@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+
+def is_local(alias):
+    """Whether the ``alias`` cache is kept in the memory of each process."""
+    return isinstance(caches[alias], LocMemCache)
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    if settings.DATABASE_REPLICAS and is_local(settings.DATABASE_REPLICA_PIN_CACHE):
+        return [
+            Warning(
+                "Read replicas are used with a local memory pin cache.",
+                hint=(
+                    "Users are only pinned to the default database in the process "
+                    "serving their write. Set DATABASE_REPLICA_PIN_CACHE_URL to a "
+                    "shared cache unless serving with a single process."
+                ),
+                id="books.W001",
+            )
+        ]
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_catalog_cache(app_configs, **kwargs):
+    if is_local(settings.CATALOG_CACHE):
+        return [
+            Warning(
+                "The catalog cache is kept in the memory of each process.",
+                hint=(
+                    "Changes only invalidate the responses cached by the process "
+                    "making them. Set CATALOG_CACHE_URL to a shared cache unless "
+                    "serving with a single process."
+                ),
+                id="books.W002",
+            )
+        ]
+    return []
+
+
+@register(Tags.caches, Tags.security, deploy=True)
+def check_auth_cache(app_configs, **kwargs):
+    if is_local(settings.AUTH_CACHE):
+        return [
+            Warning(
+                "Verified tokens and permissions are cached per process.",
+                hint=(
+                    "Revoked tokens and permissions are accepted by other workers "
+                    "for up to AUTH_LOCAL_CACHE_TIMEOUT seconds. Set AUTH_CACHE_URL "
+                    "to a shared cache unless serving with a single process."
+                ),
+                id="books.W003",
+            )
+        ]
+    return []
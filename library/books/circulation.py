@@ -0,0 +1,201 @@
+from collections import defaultdict
+
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+from library.books.locks import exclusive
+from library.books.models import (
+    ArchivedBorrow,
+    Book,
+    Borrow,
+    CirculationDelta,
+    CirculationStat,
+)
+
+LOCK_NAME = "library.books.circulation"
+
+
+def _attributions(book_ids, chunk_size=1000):
+    """Return the current type and tag keys of the given books, by book id."""
+    book_ids = sorted(book_ids)
+    attributions = {}
+    for start in range(0, len(book_ids), chunk_size):
+        books = Book.objects.filter(pk__in=book_ids[start : start + chunk_size])
+        for pk, book_type, tag_id in books.values_list("pk", "type", "tags"):
+            attribution = attributions.setdefault(
+                pk, [[CirculationStat.DIMENSION_TYPE, book_type]]
+            )
+            if tag_id is not None:
+                attribution.append([CirculationStat.DIMENSION_TAG, str(tag_id)])
+    return attributions
+
+
+def _keys(book_id, attribution):
+    return [
+        (CirculationStat.DIMENSION_TOTAL, ""),
+        (CirculationStat.DIMENSION_BOOK, str(book_id)),
+        *(tuple(key) for key in attribution),
+    ]
+
+
+def _book_rollups(borrows, penalty):
+    """Yield the month, book, borrows and paid penalties of ``borrows`` per book and month."""
+    paid = Q(**{f"{penalty}__is_paid": True})
+    return (
+        borrows.filter(borrowed_at__isnull=False)
+        .annotate(month=TruncMonth("borrowed_at", output_field=DateField()))
+        .order_by()
+        .values_list("month", "book")
+        .annotate(
+            borrows=Count("pk"),
+            penalty_revenue=Coalesce(Sum(f"{penalty}__amount", filter=paid), 0),
+        )
+    )
+
+
+def _delete_deltas(pks, batch_size):
+    for start in range(0, len(pks), batch_size):
+        CirculationDelta.objects.filter(pk__in=pks[start : start + batch_size]).delete()
+
+
+def update(batch_size=1000):
+    """Fold the recorded deltas into the rollups, ``batch_size`` at a time.
+
+    Changes go to the keys the book and month were first counted under.
+    Changes to a book and month which were never counted (e.g. borrows older
+    than the rollups) are dropped unless they only add. Returns the number of
+    folded deltas.
+    """
+    folded = 0
+    while True:
+        with exclusive(LOCK_NAME):
+            deltas = list(
+                CirculationDelta.objects.order_by("pk").values_list(
+                    "pk", "month", "book_id", "borrows", "penalty_revenue"
+                )[:batch_size]
+            )
+            if not deltas:
+                return folded
+            changes = defaultdict(lambda: [0, 0])
+            for pk, month, book_id, borrows, penalty_revenue in deltas:
+                changes[month, book_id][0] += borrows
+                changes[month, book_id][1] += penalty_revenue
+            months = {month for month, book_id in changes}
+            book_rows = CirculationStat.objects.filter(
+                dimension=CirculationStat.DIMENSION_BOOK,
+                month__in=months,
+                key__in={str(book_id) for month, book_id in changes},
+            )
+            attributions = {
+                (row.month, int(row.key)): row.attribution for row in book_rows
+            }
+            uncounted = {
+                book_id
+                for month, book_id in changes
+                if (month, book_id) not in attributions
+            }
+            current = _attributions(uncounted)
+            for (month, book_id), (borrows, penalty_revenue) in list(changes.items()):
+                if (month, book_id) in attributions:
+                    continue
+                if book_id in current and borrows >= 0 and penalty_revenue >= 0:
+                    attributions[month, book_id] = current[book_id]
+                else:
+                    del changes[month, book_id]
+            totals = defaultdict(lambda: [0, 0])
+            for (month, book_id), (borrows, penalty_revenue) in changes.items():
+                for dimension, key in _keys(book_id, attributions[month, book_id]):
+                    totals[dimension, month, key][0] += borrows
+                    totals[dimension, month, key][1] += penalty_revenue
+            keys = defaultdict(set)
+            for dimension, month, key in totals:
+                keys[dimension].add(key)
+            rows = {}
+            for dimension, dimension_keys in keys.items():
+                for row in CirculationStat.objects.filter(
+                    dimension=dimension, month__in=months, key__in=dimension_keys
+                ):
+                    if (dimension, row.month, row.key) in totals:
+                        rows[dimension, row.month, row.key] = row
+            new = []
+            for (dimension, month, key), (borrows, penalty_revenue) in totals.items():
+                row = rows.get((dimension, month, key))
+                if row is None:
+                    row = CirculationStat(dimension=dimension, month=month, key=key)
+                    if dimension == CirculationStat.DIMENSION_BOOK:
+                        row.attribution = attributions[month, int(key)]
+                    new.append(row)
+                row.borrows += borrows
+                row.penalty_revenue += penalty_revenue
+            CirculationStat.objects.bulk_create(new, batch_size=1000)
+            CirculationStat.objects.bulk_update(
+                rows.values(), ("borrows", "penalty_revenue"), batch_size=1000
+            )
+            _delete_deltas([delta[0] for delta in deltas], 1000)
+        folded += len(deltas)
+
+
+def rebuild(batch_size=1000):
+    """Recompute every rollup from the live and archived borrows.
+
+    Books are counted under their current type and tags, and the deltas
+    recorded until then are dropped. Returns the number of rollups.
+    """
+    with exclusive(LOCK_NAME):
+        books = defaultdict(lambda: [0, 0])
+        for queryset, penalty in (
+            (Borrow.objects.all(), "delaypenalty"),
+            (ArchivedBorrow.objects.all(), "penalty"),
+        ):
+            for month, book_id, borrows, penalty_revenue in _book_rollups(
+                queryset, penalty
+            ):
+                books[month, book_id][0] += borrows
+                books[month, book_id][1] += penalty_revenue
+        attributions = _attributions({book_id for month, book_id in books})
+        rows = {}
+        for (month, book_id), (borrows, penalty_revenue) in books.items():
+            attribution = attributions.get(book_id, [])
+            for dimension, key in _keys(book_id, attribution):
+                row = rows.get((dimension, month, key))
+                if row is None:
+                    row = rows[dimension, month, key] = CirculationStat(
+                        dimension=dimension, month=month, key=key
+                    )
+                    if dimension == CirculationStat.DIMENSION_BOOK:
+                        row.attribution = attribution
+                row.borrows += borrows
+                row.penalty_revenue += penalty_revenue
+        # Deltas are deleted by id, so that those recorded after the snapshot
+        # are kept for the next update.
+        _delete_deltas(
+            list(CirculationDelta.objects.values_list("pk", flat=True)), batch_size
+        )
+        CirculationStat.objects.all().delete()
+        CirculationStat.objects.bulk_create(rows.values(), batch_size=batch_size)
+    return len(rows)
+
+
+def top_books(stats, limit):
+    """Sum the book rollups of ``stats`` per book and return the ``limit`` most borrowed."""
+    rows = list(
+        stats.filter(dimension=CirculationStat.DIMENSION_BOOK)
+        .values("key")
+        .annotate(borrows=Sum("borrows"), penalty_revenue=Sum("penalty_revenue"))
+        .filter(borrows__gt=0)
+        .order_by("-borrows", "key")[:limit]
+    )
+    titles = dict(
+        Book.objects.filter(pk__in=[row["key"] for row in rows]).values_list(
+            "pk", "title"
+        )
+    )
+    return [
+        {
+            "book": int(row["key"]),
+            "title": titles.get(int(row["key"])),
+            "borrows": row["borrows"],
+            "penalty_revenue": row["penalty_revenue"],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from library.books import cache as catalog_cache
+from library.books.models import Book, Tag
+
+# Unfiltered counts are kept per tag and per type in the catalog cache, outside
+# of the versioned responses, and adjusted as books and their tags change.
+
+
+def _tag_key(tag_id):
+    return f"catalog:facets:tag:{tag_id}"
+
+
+def _type_key(book_type):
+    return f"catalog:facets:type:{book_type}"
+
+
+def _cached_counts(keys, count):
+    """Read the counts of ``keys`` from the cache, or all of them from ``count()``."""
+    cache = catalog_cache.get_cache()
+    cached = cache.get_many(keys.values())
+    if len(cached) == len(keys):
+        return {value: cached[key] for value, key in keys.items()}
+    counts = dict.fromkeys(keys, 0)
+    counts.update(count())
+    cache.set_many(
+        {keys[value]: counts[value] for value in keys}, settings.CATALOG_CACHE_TIMEOUT
+    )
+    return counts
+
+
+def tag_counts():
+    tags = dict(Tag.objects.values_list("pk", "name"))
+    counts = _cached_counts(
+        {tag_id: _tag_key(tag_id) for tag_id in tags},
+        lambda: Book.tags.through.objects.order_by()
+        .values_list("tag")
+        .annotate(count=Count("pk")),
+    )
+    return [(tag_id, tags[tag_id], count) for tag_id, count in counts.items()]
+
+
+def type_counts():
+    return _cached_counts(
+        {book_type: _type_key(book_type) for book_type, label in Book.TYPE_CHOICES},
+        lambda: Book.objects.order_by().values_list("type").annotate(count=Count("pk")),
+    )
+
+
+def _adjust(deltas):
+    cache = catalog_cache.get_cache()
+    for key, delta in deltas.items():
+        try:
+            if delta > 0:
+                cache.incr(key, delta)
+            elif delta < 0:
+                cache.decr(key, -delta)
+        except ValueError:
+            # Not cached: counted in full on the next read.
+            pass
+
+
+def count_tags(deltas):
+    """Add ``deltas`` (by tag id) to the cached tag counts once the transaction commits."""
+    deltas = {_tag_key(tag_id): delta for tag_id, delta in deltas.items()}
+    transaction.on_commit(lambda: _adjust(deltas))
+
+
+def count_types(deltas):
+    """Add ``deltas`` (by book type) to the cached type counts once the transaction commits."""
+    deltas = {_type_key(book_type): delta for book_type, delta in deltas.items()}
+    transaction.on_commit(lambda: _adjust(deltas))
+
+
+def count_new_tag(tag_id):
+    key = _tag_key(tag_id)
+    transaction.on_commit(
+        lambda: catalog_cache.get_cache().add(key, 0, settings.CATALOG_CACHE_TIMEOUT)
+    )
+
+
+def forget():
+    """Drop every cached count, now and on commit, e.g. after a bulk insert of books."""
+    keys = [_type_key(book_type) for book_type, label in Book.TYPE_CHOICES]
+    keys += [_tag_key(tag_id) for tag_id in Tag.objects.values_list("pk", flat=True)]
+    catalog_cache.get_cache().delete_many(keys)
+    transaction.on_commit(lambda: catalog_cache.get_cache().delete_many(keys))
+
+
+def count_books(queryset=None):
+    """Count the books of ``queryset`` (or all of them) by tag and by type."""
+    if queryset is None:
+        tags, types = tag_counts(), type_counts()
+    else:
+        books = Book.objects.filter(pk__in=queryset.order_by().values("pk"))
+        tags = Tag.objects.filter(book__in=books).annotate(count=Count("book"))
+        tags = tags.values_list("pk", "name", "count")
+        types = dict(books.order_by().values_list("type").annotate(count=Count("pk")))
+    labels = dict(Book.TYPE_CHOICES)
+    return {
+        "types": [
+            {
+                "type": book_type,
+                "type_verbose": str(labels[book_type]),
+                "count": types.get(book_type, 0),
+            }
+            for book_type in labels
+        ],
+        "tags": [
+            {"id": tag_id, "name": name, "count": count}
+            for tag_id, name, count in sorted(tags, key=lambda tag: (-tag[2], tag[1]))
+            if count
+        ],
+    }
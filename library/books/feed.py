@@ -0,0 +1,54 @@
+from django.db.models import F, Max
+from rest_framework.utils.urls import replace_query_param
+
+from library.books.locks import exclusive
+from library.books.models import BorrowEvent
+from library.books.serializers import BorrowEventSerializer
+
+LOCK_NAME = "library.books.feed"
+
+
+def sequence(batch_size=1000):
+    """Give a feed position to the committed events which have none yet.
+
+    Positions are handed out in the order events become visible, after every
+    position given before, so an event committed late (e.g. by a long
+    transaction holding a smaller id) is still served after the ones already
+    read rather than skipped. Returns the number of positioned events.
+    """
+    pending = BorrowEvent.objects.filter(position__isnull=True)
+    positioned = 0
+    while pending.exists():
+        with exclusive(LOCK_NAME):
+            ids = list(pending.order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            last = BorrowEvent.objects.aggregate(last=Max("position"))["last"] or 0
+            # Positions follow ids where they can, which keeps them equal to
+            # the ids of events committed in order.
+            BorrowEvent.objects.filter(pk__in=ids).update(
+                position=F("pk") + max(last - ids[0] + 1, 0)
+            )
+        positioned += len(ids)
+        if len(ids) < batch_size:
+            break
+    return positioned
+
+
+def read(after, limit, student_id=None):
+    """Return up to ``limit`` events positioned after ``after``, of ``student_id`` if given."""
+    sequence()
+    events = BorrowEvent.objects.filter(position__gt=after).order_by("position")
+    if student_id is not None:
+        events = events.filter(student_id=student_id)
+    return list(events[:limit])
+
+
+def page(url, after, events):
+    """Feed response data of ``events``, read after ``after`` from ``url``."""
+    last = events[-1].position if events else after
+    return {
+        "last": last,
+        "next": replace_query_param(url, "after", last),
+        "results": BorrowEventSerializer(events, many=True).data,
+    }
@@ -0,0 +1,35 @@
+import django_filters
+from django.db.models import F
+from rest_framework.filters import SearchFilter
+
+from library.books.models import Book
+from library.books.search import get_search_backend
+
+
+class BookSearchFilter(SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "").strip()
+        if not query:
+            return queryset
+        return get_search_backend().search(queryset, query)
+
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
+class BookFilterSet(django_filters.FilterSet):
+    # Generated from the many-to-many field, it would reject every list of ids.
+    tags__in = NumberInFilter(field_name="tags", lookup_expr="in", distinct=True)
+    available = django_filters.BooleanFilter(method="filter_available")
+
+    class Meta:
+        model = Book
+        fields = {
+            "type": ["in"],
+        }
+
+    def filter_available(self, queryset, name, value):
+        if value:
+            return queryset.available()
+        return queryset.filter(out_copies__gte=F("copies"))
@@ -0,0 +1,43 @@
+import zlib
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+# Session locks keeping jobs of the same name from running at the same time;
+# sqlite runs one write transaction at a time anyway.
+LOCKS = {
+    "postgresql": (
+        "SELECT pg_advisory_lock(%s)",
+        "SELECT pg_advisory_unlock(%s)",
+        lambda name: zlib.crc32(name.encode()),
+    ),
+    "mysql": (
+        "SELECT GET_LOCK(%s, -1)",
+        "SELECT RELEASE_LOCK(%s)",
+        lambda name: name,
+    ),
+}
+
+
+@contextmanager
+def exclusive(name):
+    """Run the block alone among those locking ``name``, in a transaction reading one snapshot.
+
+    The lock is taken before the transaction starts, so that the snapshot
+    includes everything the previous holder wrote.
+    """
+    lock = LOCKS.get(connection.vendor)
+    snapshot = connection.vendor == "postgresql" and not connection.in_atomic_block
+    if lock:
+        with connection.cursor() as cursor:
+            cursor.execute(lock[0], [lock[2](name)])
+    try:
+        with transaction.atomic():
+            if snapshot:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            yield
+    finally:
+        if lock:
+            with connection.cursor() as cursor:
+                cursor.execute(lock[1], [lock[2](name)])
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.books.penalties import apply_delay_penalties
+
+
+class Command(BaseCommand):
+    help = "Charge delay penalties for every overdue borrow which is not returned yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created, updated = apply_delay_penalties(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {created} and updated {updated} delay penalties "
+                f"in {time.monotonic() - started:.1f}s."
+            )
+        )
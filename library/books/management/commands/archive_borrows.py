@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from library.books.archive import archive_borrows, months_before
+
+
+class Command(BaseCommand):
+    help = (
+        "Move borrows returned more than some months ago, with their paid delay "
+        "penalties, to the archive tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months", type=int, default=settings.BORROW_ARCHIVE_MONTHS
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0.1, help="Seconds to wait between batches."
+        )
+        parser.add_argument(
+            "--limit", type=int, default=None, help="Archive at most this many borrows."
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        before = months_before(timezone.now(), options["months"])
+        borrows, penalties = archive_borrows(
+            before,
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            limit=options["limit"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {borrows} borrow(s) and {penalties} delay penalty(ies) "
+                f"returned before {before:%Y-%m-%d} in {time.monotonic() - started:.1f}s."
+            )
+        )
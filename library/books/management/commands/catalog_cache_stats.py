@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from library.books import cache as catalog_cache
+
+
+class Command(BaseCommand):
+    help = "Show hit and miss counts of the catalog response cache."
+
+    def handle(self, *args, **options):
+        stats = catalog_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups if lookups else 0
+        self.stdout.write(
+            f"Hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {ratio:.1%}"
+        )
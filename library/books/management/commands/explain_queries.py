@@ -0,0 +1,88 @@
+import datetime
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from library.books.models import ArchivedBorrow, Borrow, DelayPenalty
+
+# Full table scans, per database vendor; sqlite also builds automatic indexes
+# when none fits a join.
+SEQUENTIAL_SCANS = {
+    "sqlite": re.compile(
+        r"\bSCAN (?:TABLE )?(\w+)\b(?! USING)|AUTOMATIC \w* ?INDEX ON (\w+)"
+    ),
+    "postgresql": re.compile(r"\bSeq Scan on (\w+)"),
+    "mysql": re.compile(r"\bTable scan on (\w+)"),
+}
+
+
+def canonical_queries():
+    """Name the queries the API and the maintenance commands run the most."""
+    now = timezone.now()
+    newest = ("-requested_at", "-id")
+    return {
+        "borrows of a student": Borrow.objects.filter(student=1).order_by(*newest)[
+            :100
+        ],
+        "archived borrows of a student": ArchivedBorrow.objects.filter(
+            student=1
+        ).order_by(*newest)[:100],
+        "borrows requested in a range": Borrow.objects.filter(
+            requested_at__gte=now - datetime.timedelta(days=30),
+            requested_at__lte=now,
+        ).order_by(*newest)[:100],
+        "open borrows of a student": Borrow.objects.open().filter(student=1),
+        "open borrows of a book": Borrow.objects.open().filter(book=1),
+        "overdue borrows": Borrow.objects.overdue(now).order_by("pk")[:1000],
+        "unpaid delay penalties": DelayPenalty.objects.filter(is_paid=False).order_by(
+            "id"
+        )[:100],
+        "unpaid delay penalties of a student": DelayPenalty.objects.filter(
+            borrow__student=1, is_paid=False
+        ),
+    }
+
+
+def explain(queryset):
+    options = {"format": "tree"} if connection.vendor == "mysql" else {}
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            # Small tables are cheaper to scan, so only fall back to a scan
+            # when no index can answer the query at all.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain(**options)
+
+
+def sequential_scans(plan):
+    """Return the tables ``plan`` reads in full."""
+    pattern = SEQUENTIAL_SCANS[connection.vendor]
+    return sorted({next(filter(None, match)) for match in pattern.findall(plan)})
+
+
+class Command(BaseCommand):
+    help = "Explain the canonical queries of the app and report sequential scans."
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SEQUENTIAL_SCANS:
+            raise CommandError(f"Plans of {connection.vendor} are not supported.")
+        flagged = 0
+        for name, queryset in canonical_queries().items():
+            plan = explain(queryset)
+            tables = sequential_scans(plan)
+            if tables:
+                flagged += 1
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{name}: sequential scan on {', '.join(tables)}"
+                    )
+                )
+            else:
+                self.stdout.write(f"{name}: OK")
+            if options["verbosity"] > 1:
+                self.stdout.write(plan)
+        if flagged:
+            raise CommandError(f"{flagged} query(ies) read a table in full.")
+        self.stdout.write(self.style.SUCCESS("Every query uses an index."))
@@ -0,0 +1,303 @@
+import datetime
+import math
+import random
+import time
+from collections import Counter
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from library.books import cache as catalog_cache
+from library.books import circulation, facets
+from library.books import related
+from library.books.models import Book, Borrow, DelayPenalty, StudentStanding, Tag
+from library.books.search import get_search_backend
+
+SYLLABLES = (
+    "ba be bi bo da de di do fa fe ka ke ki ko la le li lo ma me mi mo na ne ni no "
+    "ra re ri ro sa se si so ta te ti to va ve za ze zi zo"
+).split()
+TYPES = (
+    (Book.TYPE_RESOURCE, 0.6),
+    (Book.TYPE_ARTICLE, 0.25),
+    (Book.TYPE_THESIS, 0.1),
+    (Book.TYPE_OTHER, 0.05),
+)
+DURATIONS = (7, 14, 14, 30)
+TOPIC_SIZE = 20
+
+
+def zipf_weights(n, exponent):
+    return list(accumulate(1 / rank**exponent for rank in range(1, n + 1)))
+
+
+def batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class Command(BaseCommand):
+    help = "Fill the database with a large synthetic library for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=1000000)
+        parser.add_argument("--tags", type=int, default=5000)
+        parser.add_argument("--students", type=int, default=100000)
+        parser.add_argument("--borrows", type=int, default=2000000)
+        parser.add_argument("--days", type=int, default=3 * 365)
+        parser.add_argument(
+            "--late-rate",
+            type=float,
+            default=0.1,
+            help="Fraction of borrows returned after their duration.",
+        )
+        parser.add_argument(
+            "--open-rate",
+            type=float,
+            default=0.2,
+            help="Fraction of students keeping their last borrow, if a copy is left.",
+        )
+        parser.add_argument("--popularity-exponent", type=float, default=1.1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--password",
+            help="Password of the generated students (unusable if omitted).",
+        )
+        parser.add_argument(
+            "--build-indexes",
+            action="store_true",
+            help="Also rebuild the search and related books indexes.",
+        )
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(
+                "The database does not return the keys of bulk inserted rows."
+            )
+        self.options = options
+        self.batch_size = options["batch_size"]
+        self.random = random.Random(options["seed"])
+        self.now = timezone.now()
+        self.words = self.vocabulary(5000)
+        self.names = self.vocabulary(2000)
+
+        started = time.monotonic()
+        self.log(f"{options['tags']} tags", self.generate_tags)
+        self.log(f"{options['books']} books", self.generate_books)
+        self.log(f"{options['students']} students", self.generate_students)
+        self.log("borrows and delay penalties", self.generate_borrows)
+        self.log("copies out", Book.objects.reconcile_out_copies)
+        self.log("student standings", StudentStanding.objects.reconcile)
+        self.log("circulation statistics", circulation.rebuild)
+        if options["build_indexes"]:
+            self.log("search index", get_search_backend().rebuild)
+            self.log("related books index", related.rebuild_index)
+        catalog_cache.invalidate(catalog_cache.TAGS)
+        facets.forget()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {self.stats['borrows']} borrows and "
+                f"{self.stats['penalties']} delay penalties for {options['books']} "
+                f"books and {options['students']} students in "
+                f"{time.monotonic() - started:.1f}s."
+            )
+        )
+
+    def log(self, label, step):
+        started = time.monotonic()
+        step()
+        self.stdout.write(f"Generated {label} in {time.monotonic() - started:.1f}s.")
+
+    def vocabulary(self, size):
+        words = set()
+        while len(words) < size:
+            count = self.random.randint(2, 4)
+            words.add("".join(self.random.choices(SYLLABLES, k=count)).capitalize())
+        return sorted(words)
+
+    def zipf_choices(self, population, cum_weights, k):
+        return self.random.choices(population, cum_weights=cum_weights, k=k)
+
+    @transaction.atomic
+    def generate_tags(self):
+        offset = Tag.objects.count()
+        tags = Tag.objects.bulk_create(
+            (
+                Tag(name=f"{self.random.choice(self.words)} {offset + n}")
+                for n in range(self.options["tags"])
+            ),
+            batch_size=self.batch_size,
+        )
+        # Tags are grouped in topics, and the tags of a book mostly come from
+        # the same topic, so that tags co-occur like real subjects do.
+        self.tag_ids = [tag.pk for tag in tags]
+        self.topics = list(batched(self.tag_ids, TOPIC_SIZE))
+        self.topic_weights = zipf_weights(len(self.topics), 1)
+        self.tag_weights = zipf_weights(TOPIC_SIZE, 1)
+
+    def book_tags(self):
+        topic = self.zipf_choices(self.topics, self.topic_weights, 1)[0]
+        count = min(self.random.choice((1, 1, 2, 2, 3, 4)), len(topic))
+        tags = set(self.zipf_choices(topic, self.tag_weights[: len(topic)], count))
+        if self.random.random() < 0.1:
+            tags.add(self.random.choice(self.tag_ids))
+        return tags
+
+    def new_book(self, number, rank):
+        title_length = self.random.randint(2, 6)
+        author_count = self.random.choice((1, 1, 1, 2, 2, 3))
+        # The most popular books are stocked with more copies.
+        copies = 1 + int(self.random.expovariate(1) * (4 if rank < 1000 else 1))
+        return Book(
+            title=" ".join(self.random.choices(self.words, k=title_length)),
+            isbn=f"979{number:010d}",
+            authors=", ".join(
+                f"{self.random.choice(self.names)} {self.random.choice(self.names)}"
+                for _ in range(author_count)
+            ),
+            type=self.random.choices(*zip(*TYPES))[0],
+            copies=min(copies, 30),
+        )
+
+    def generate_books(self):
+        offset = Book.objects.count()
+        total = self.options["books"]
+        # Popularity ranks are shuffled, so that popular books are spread over
+        # the whole id range.
+        ranks = list(range(total))
+        self.random.shuffle(ranks)
+        self.book_ids = [None] * total
+        self.copies = [0] * total
+        through = Book.tags.through
+        for start in range(0, total, self.batch_size):
+            numbers = range(start, min(start + self.batch_size, total))
+            with transaction.atomic():
+                books = Book.objects.bulk_create(
+                    self.new_book(offset + number, ranks[number]) for number in numbers
+                )
+                through.objects.bulk_create(
+                    through(book_id=book.pk, tag_id=tag_id)
+                    for book in books
+                    for tag_id in self.book_tags()
+                )
+            for number, book in zip(numbers, books):
+                self.book_ids[ranks[number]] = book.pk
+                self.copies[ranks[number]] = book.copies
+        self.book_weights = zipf_weights(total, self.options["popularity_exponent"])
+
+    @transaction.atomic
+    def generate_students(self):
+        group, created = Group.objects.get_or_create(name="Student")
+        offset = User.objects.count()
+        password = make_password(self.options["password"])
+        self.student_ids = []
+        through = User.groups.through
+        for numbers in batched(range(self.options["students"]), self.batch_size):
+            users = User.objects.bulk_create(
+                User(
+                    username=f"student{offset + number}",
+                    first_name=self.random.choice(self.names),
+                    last_name=self.random.choice(self.names),
+                    password=password,
+                )
+                for number in numbers
+            )
+            through.objects.bulk_create(
+                through(user_id=user.pk, group_id=group.pk) for user in users
+            )
+            self.student_ids.extend(user.pk for user in users)
+
+    def student_timeline(self, student_id, count, out):
+        """Sequential borrows of one student, spread over the generated period.
+
+        Returns borrows paired with the penalty they are charged, if any.
+        """
+        days = self.options["days"]
+        slot = days / count
+        start = self.now - datetime.timedelta(days=days)
+        ranks = self.zipf_choices(range(len(self.book_ids)), self.book_weights, count)
+        keep_open = self.random.random() < self.options["open_rate"]
+        timeline = []
+        for index, rank in enumerate(ranks):
+            requested_at = start + datetime.timedelta(
+                days=slot * (index + self.random.random() * 0.2)
+            )
+            slot_end = start + datetime.timedelta(days=slot * (index + 1))
+            is_open = index == count - 1 and keep_open and out[rank] < self.copies[rank]
+            borrow = Borrow(
+                student_id=student_id,
+                book_id=self.book_ids[rank],
+                requested_at=requested_at,
+            )
+            if is_open:
+                out[rank] += 1
+                if self.random.random() < 0.1:
+                    timeline.append((borrow, None))
+                    continue
+            borrow.borrowed_at = requested_at + datetime.timedelta(
+                hours=self.random.uniform(0, 48)
+            )
+            borrow.duration = self.random.choice(DURATIONS)
+            if self.random.random() < self.options["late_rate"]:
+                out_days = borrow.duration + 1 + int(self.random.expovariate(0.2))
+            else:
+                out_days = self.random.randint(1, borrow.duration)
+            returned_at = borrow.borrowed_at + datetime.timedelta(
+                days=out_days - 1, hours=self.random.uniform(0, 8)
+            )
+            if is_open:
+                ending = self.now
+            else:
+                ending = borrow.returned_at = max(
+                    min(returned_at, slot_end), borrow.borrowed_at
+                )
+            penalty = None
+            out_days = Borrow.count_out_days(borrow.borrowed_at, ending)
+            if out_days > borrow.duration:
+                penalty = DelayPenalty(
+                    amount=DelayPenalty.amount_for(out_days, borrow.duration),
+                    is_paid=borrow.returned_at is not None
+                    and self.random.random() < 0.9,
+                )
+            timeline.append((borrow, penalty))
+        return timeline
+
+    def generate_borrows(self):
+        # Student activity is log-normal: most students borrow a few books and
+        # a few of them borrow a lot.
+        mean = self.options["borrows"] / max(len(self.student_ids), 1) / math.exp(0.5)
+        most = max(self.options["days"] // 3, 1)
+        out = Counter()
+        self.stats = {"borrows": 0, "penalties": 0}
+        for students in batched(self.student_ids, self.batch_size // 10 or 1):
+            timelines = []
+            for student_id in students:
+                expected = mean * self.random.lognormvariate(0, 1)
+                count = int(expected) + (self.random.random() < expected % 1)
+                if count:
+                    timelines.extend(
+                        self.student_timeline(student_id, min(count, most), out)
+                    )
+            # requested_at is set to now on insert (auto_now_add), so the
+            # generated dates are written back afterwards.
+            requested = [borrow.requested_at for borrow, penalty in timelines]
+            with transaction.atomic():
+                borrows = Borrow.objects.bulk_create(
+                    borrow for borrow, penalty in timelines
+                )
+                for borrow, requested_at in zip(borrows, requested):
+                    borrow.requested_at = requested_at
+                Borrow.objects.bulk_update(borrows, ("requested_at",), batch_size=1000)
+                penalties = []
+                for borrow, (unsaved, penalty) in zip(borrows, timelines):
+                    if penalty:
+                        penalty.borrow_id = borrow.pk
+                        penalties.append(penalty)
+                DelayPenalty.objects.bulk_create(penalties)
+            self.stats["borrows"] += len(borrows)
+            self.stats["penalties"] += len(penalties)
@@ -0,0 +1,172 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from library.books import cache as catalog_cache
+from library.books import facets
+from library.books import related
+from library.books.models import Book, Tag
+from library.books.search import get_search_backend
+
+FIELDS = ("title", "isbn", "authors", "type", "copies")
+
+
+def read_csv(stream, tag_separator):
+    for row in csv.DictReader(stream):
+        tags = row.get("tags") or ""
+        row["tags"] = [tag for tag in tags.split(tag_separator) if tag.strip()]
+        yield row
+
+
+def read_jsonl(stream, tag_separator):
+    """Yield the object of each line, or the ``ValidationError`` of lines which are not one."""
+    for line in stream:
+        if line.strip():
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ValidationError(f"Malformed JSON: {e}")
+                continue
+            if not isinstance(row, dict):
+                yield ValidationError("Not a JSON object.")
+                continue
+            if isinstance(row.get("tags"), str):
+                row["tags"] = row["tags"].split(tag_separator)
+            yield row
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+class Command(BaseCommand):
+    help = "Import books from a CSV or JSON lines file in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - for standard input.")
+        parser.add_argument("--format", choices=READERS, default=None)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--tag-separator", default="|")
+        parser.add_argument(
+            "--skip-related-index",
+            action="store_true",
+            help="Do not rebuild the related books index after importing.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        input_format = options["format"] or (
+            "csv" if path.endswith(".csv") else "jsonl"
+        )
+        try:
+            stream = (
+                sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+            )
+        except OSError as e:
+            raise CommandError(e)
+        self.stats = {"imported": 0, "duplicates": 0, "rejected": 0}
+        started = time.monotonic()
+        try:
+            rows = enumerate(READERS[input_format](stream, options["tag_separator"]), 1)
+            while True:
+                batch = list(islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                self.import_batch(batch)
+        except csv.Error as e:
+            raise CommandError(f"Malformed input: {e}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        if self.stats["imported"] and not options["skip_related_index"]:
+            related.rebuild_index()
+        elapsed = time.monotonic() - started
+        total = sum(self.stats.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.stats['imported']} book(s), skipped "
+                f"{self.stats['duplicates']} duplicate(s) and rejected "
+                f"{self.stats['rejected']} row(s) in {elapsed:.1f}s "
+                f"({total / elapsed if elapsed else total:.0f} rows/s)."
+            )
+        )
+
+    def reject(self, line, errors):
+        self.stats["rejected"] += 1
+        for field, messages in errors.items():
+            self.stderr.write(f"Row {line}: {field}: {' '.join(messages)}")
+
+    def validate(self, batch):
+        """Clean the batch column by column with the validators of the model fields."""
+        for line, row in batch:
+            if isinstance(row, ValidationError):
+                self.reject(line, {"json": row.messages})
+        batch = [(line, row) for line, row in batch if isinstance(row, dict)]
+        errors = {line: {} for line, row in batch}
+        cleaned = {line: {} for line, row in batch}
+        for name in FIELDS:
+            field = Book._meta.get_field(name)
+            for line, row in batch:
+                value = row.get(name)
+                if isinstance(value, str):
+                    value = value.strip()
+                try:
+                    cleaned[line][name] = field.clean(value, None)
+                except ValidationError as e:
+                    errors[line][name] = e.messages
+        tag_field = Tag._meta.get_field("name")
+        for line, row in batch:
+            tags = row.get("tags") or []
+            try:
+                cleaned[line]["tags"] = {
+                    tag_field.clean(tag.strip(), None) for tag in tags
+                }
+            except (ValidationError, AttributeError) as e:
+                errors[line]["tags"] = getattr(e, "messages", [str(e)])
+        for line, row in batch:
+            if errors[line]:
+                self.reject(line, errors[line])
+                del cleaned[line]
+        return cleaned
+
+    @transaction.atomic
+    def import_batch(self, batch):
+        cleaned = self.validate(batch)
+        existing = set(
+            Book.objects.filter(
+                isbn__in=[row["isbn"] for row in cleaned.values()]
+            ).values_list("isbn", flat=True)
+        )
+        books = {}
+        for row in cleaned.values():
+            if row["isbn"] in existing or row["isbn"] in books:
+                self.stats["duplicates"] += 1
+                continue
+            books[row["isbn"]] = row
+        if not books:
+            return
+
+        names = set().union(*(row["tags"] for row in books.values()))
+        Tag.objects.bulk_create(
+            (Tag(name=name) for name in names), ignore_conflicts=True
+        )
+        tag_ids = dict(Tag.objects.filter(name__in=names).values_list("name", "pk"))
+
+        Book.objects.bulk_create(
+            Book(**{name: row[name] for name in FIELDS}) for row in books.values()
+        )
+        created = Book.objects.filter(isbn__in=books)
+        Book.tags.through.objects.bulk_create(
+            Book.tags.through(book_id=book_id, tag_id=tag_ids[name])
+            for isbn, book_id in created.values_list("isbn", "pk")
+            for name in books[isbn]["tags"]
+        )
+        get_search_backend().index(created.only("title", "authors"))
+        catalog_cache.invalidate(catalog_cache.TAGS)
+        facets.forget()
+        self.stats["imported"] += len(books)
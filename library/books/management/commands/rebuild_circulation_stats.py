@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.books import circulation
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly circulation statistics from live and archived borrows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = circulation.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {count} circulation statistic(s) "
+                f"in {time.monotonic() - started:.1f}s."
+            )
+        )
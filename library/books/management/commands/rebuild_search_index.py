@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from library.books import cache as catalog_cache
+from library.books.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the book search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = get_search_backend().rebuild(batch_size=options["batch_size"])
+        catalog_cache.invalidate(catalog_cache.BOOKS)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} search tokens."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from library.books.models import Book
+
+
+class Command(BaseCommand):
+    help = "Rebuild the number of copies out of every book from open borrows."
+
+    def handle(self, *args, **options):
+        fixed = Book.objects.reconcile_out_copies()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} book(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from library.books.models import StudentStanding
+
+
+class Command(BaseCommand):
+    help = "Rebuild the open borrows and unpaid penalties of every student."
+
+    def handle(self, *args, **options):
+        fixed = StudentStanding.objects.reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} student(s)."))
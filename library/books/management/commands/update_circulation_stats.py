@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.books import circulation
+
+
+class Command(BaseCommand):
+    help = "Fold the changes recorded by borrows and penalties into the circulation statistics."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        folded = circulation.update(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Folded {folded} circulation change(s) "
+                f"in {time.monotonic() - started:.1f}s."
+            )
+        )
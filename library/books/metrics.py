@@ -0,0 +1,195 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            yield f"{name}_bucket", {**labels, "le": str(bound)}, total
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, total
+
+
+class Registry:
+    """Process-local counters and histograms, keyed by metric name and labels."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, buckets, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def samples(self):
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                yield name, dict(labels), value
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                yield from histogram.samples(name, dict(labels))
+
+
+registry = Registry()
+
+HELP = {
+    "library_http_requests_total": ("counter", "Handled requests."),
+    "library_http_request_duration_seconds": ("histogram", "Request latency."),
+    "library_http_response_size_bytes": ("histogram", "Response body size."),
+    "library_db_queries": ("histogram", "SQL queries per request."),
+    "library_db_query_duration_seconds_total": ("counter", "Time spent in SQL."),
+    "library_catalog_cache_requests_total": ("counter", "Catalog cache lookups."),
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render():
+    """Render the registry in the Prometheus text exposition format."""
+    lines, described = [], set()
+    for name, labels, value in registry.samples():
+        family = next((family for family in HELP if name.startswith(family)), name)
+        if family not in described and family in HELP:
+            kind, description = HELP[family]
+            lines.append(f"# HELP {family} {description}")
+            lines.append(f"# TYPE {family} {kind}")
+            described.add(family)
+        pairs = ",".join(f'{key}="{_escape(labels[key])}"' for key in labels)
+        lines.append(f"{name}{{{pairs}}} {value}" if pairs else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Record latency, SQL usage, response size and cache outcome of every route.
+
+    Requests are labelled with the view name of the matched route (e.g.
+    ``api:book-list`` or ``api:borrow-start``) and the HTTP method.
+    Unused unless ``METRICS_ENABLED`` is set. Runs natively under ASGI, so
+    that the async views are not pushed through a sync thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def time_queries(stack):
+        """Time the queries of this thread's connections until ``stack`` is closed."""
+        timer = QueryTimer()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        return timer
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            timer = self.time_queries(stack)
+            response = self.get_response(request)
+        record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        # Queries run in the sync thread of the request, whose connections are
+        # not those of the event loop.
+        stack = ExitStack()
+        timer = await sync_to_async(self.time_queries)(stack)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        record(request, response, timer, time.perf_counter() - started)
+        return response
+
+
+def record(request, response, timer, elapsed):
+    match = getattr(request, "resolver_match", None)
+    labels = {
+        "route": match.view_name if match else "unmatched",
+        "method": request.method,
+    }
+    registry.inc(
+        "library_http_requests_total",
+        {**labels, "status": str(response.status_code)},
+    )
+    registry.observe(
+        "library_http_request_duration_seconds", LATENCY_BUCKETS, labels, elapsed
+    )
+    registry.observe("library_db_queries", QUERY_BUCKETS, labels, timer.count)
+    registry.inc("library_db_query_duration_seconds_total", labels, timer.duration)
+    if not response.streaming:
+        registry.observe(
+            "library_http_response_size_bytes",
+            SIZE_BUCKETS,
+            labels,
+            len(response.content),
+        )
+    if response.has_header("X-Cache"):
+        registry.inc(
+            "library_catalog_cache_requests_total",
+            {**labels, "outcome": response["X-Cache"].lower()},
+        )
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4")
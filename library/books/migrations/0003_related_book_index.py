@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0002_alter_borrow_duration"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RelatedBook",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.PositiveIntegerField(verbose_name="score")),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="related_entries",
+                        to="books.book",
+                        verbose_name="book",
+                    ),
+                ),
+                (
+                    "related",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="related_by",
+                        to="books.book",
+                        verbose_name="related book",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "related book",
+                "verbose_name_plural": "related books",
+                "indexes": [
+                    models.Index(
+                        fields=["book", "-score", "related"],
+                        name="books_relat_book_id_3088c2_idx",
+                    )
+                ],
+                "unique_together": {("book", "related")},
+            },
+        ),
+    ]
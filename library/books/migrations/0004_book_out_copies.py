@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_out_copies(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Borrow = apps.get_model('books', 'Borrow')
+    open_borrows = (
+        Borrow.objects.filter(book=OuterRef('pk'), returned_at__isnull=True)
+        .order_by()
+        .values('book')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Book.objects.update(out_copies=Coalesce(Subquery(open_borrows), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_related_book_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='out_copies',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='number of copies out'),
+        ),
+        migrations.RunPython(count_out_copies, migrations.RunPython.noop),
+    ]
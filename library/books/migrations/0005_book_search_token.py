@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_out_copies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=3, verbose_name='token')),
+                ('weight', models.PositiveSmallIntegerField(verbose_name='weight')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='books.book', verbose_name='book')),
+            ],
+            options={
+                'verbose_name': 'search token',
+                'verbose_name_plural': 'search tokens',
+                'indexes': [models.Index(fields=['token', 'book'], name='books_books_token_9de041_idx')],
+                'unique_together': {('book', 'token')},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def compute_standings(apps, schema_editor):
+    Borrow = apps.get_model('books', 'Borrow')
+    DelayPenalty = apps.get_model('books', 'DelayPenalty')
+    StudentStanding = apps.get_model('books', 'StudentStanding')
+    standings = {
+        row['student']: StudentStanding(
+            student_id=row['student'], open_borrows=row['open_borrows']
+        )
+        for row in Borrow.objects.order_by()
+        .values('student')
+        .annotate(open_borrows=Count('pk', filter=Q(returned_at__isnull=True)))
+    }
+    unpaid = (
+        DelayPenalty.objects.filter(is_paid=False)
+        .order_by()
+        .values('borrow__student')
+        .annotate(count=Count('pk'), amount=Sum('amount'))
+    )
+    for row in unpaid:
+        standing = standings[row['borrow__student']]
+        standing.unpaid_penalties = row['count']
+        standing.unpaid_amount = row['amount']
+    StudentStanding.objects.bulk_create(standings.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('books', '0006_borrow_requested_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentStanding',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='standing', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='student')),
+                ('open_borrows', models.PositiveIntegerField(default=0, verbose_name='number of open borrows')),
+                ('unpaid_penalties', models.PositiveIntegerField(default=0, verbose_name='number of unpaid delay penalties')),
+                ('unpaid_amount', models.PositiveBigIntegerField(default=0, verbose_name='unpaid amount')),
+            ],
+            options={
+                'verbose_name': 'student standing',
+                'verbose_name_plural': 'student standings',
+            },
+        ),
+        migrations.RunPython(compute_standings, migrations.RunPython.noop),
+    ]
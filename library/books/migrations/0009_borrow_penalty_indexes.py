@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['student', 'requested_at', 'id'], name='books_borrow_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(condition=models.Q(('returned_at__isnull', True)), fields=['student'], name='books_borrow_open_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(condition=models.Q(('returned_at__isnull', True)), fields=['book'], name='books_borrow_open_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(condition=models.Q(('borrowed_at__isnull', False), ('returned_at__isnull', True)), fields=['id'], name='books_borrow_out_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delaypenalty',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['id'], name='books_penalty_unpaid_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:39
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_borrow_penalty_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BorrowEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('requested', 'requested'), ('started', 'started'), ('returned', 'returned'), ('changed', 'changed'), ('deleted', 'deleted'), ('penalized', 'penalized'), ('penalty_changed', 'penalty changed'), ('penalty_deleted', 'penalty deleted')], max_length=20, verbose_name='kind')),
+                ('borrow_id', models.BigIntegerField(verbose_name='borrow')),
+                ('student_id', models.IntegerField(verbose_name='student')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='data')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='creation date')),
+            ],
+            options={
+                'verbose_name': 'borrow event',
+                'verbose_name_plural': 'borrow events',
+                'indexes': [models.Index(fields=['student_id', 'id'], name='books_borro_student_3de8e2_idx')],
+            },
+        ),
+    ]
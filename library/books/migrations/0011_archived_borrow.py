@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_borrow_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBorrow',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('requested_at', models.DateTimeField(verbose_name='request date')),
+                ('borrowed_at', models.DateTimeField(blank=True, null=True, verbose_name='borrow date')),
+                ('duration', models.IntegerField(blank=True, null=True, verbose_name='duration')),
+                ('returned_at', models.DateTimeField(verbose_name='return date')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='archive date')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrows', to='books.book', verbose_name='book')),
+                ('student', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrows', to=settings.AUTH_USER_MODEL, verbose_name='student')),
+            ],
+            options={
+                'verbose_name': 'archived borrow',
+                'verbose_name_plural': 'archived borrows',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedDelayPenalty',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='amount')),
+                ('is_paid', models.BooleanField(verbose_name='is it paid?')),
+                ('borrow', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='penalty', to='books.archivedborrow', verbose_name='borrow')),
+            ],
+            options={
+                'verbose_name': 'archived delay penalty',
+                'verbose_name_plural': 'archived delay penalties',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedborrow',
+            index=models.Index(fields=['student', 'requested_at', 'id'], name='books_archived_student_idx'),
+        ),
+    ]
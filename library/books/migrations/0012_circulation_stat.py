@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_archived_borrow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CirculationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='month')),
+                ('dimension', models.CharField(choices=[('total', 'total'), ('type', 'type'), ('tag', 'tag'), ('book', 'book')], max_length=5, verbose_name='dimension')),
+                ('key', models.CharField(blank=True, max_length=20, verbose_name='key')),
+                ('borrows', models.IntegerField(default=0, verbose_name='number of borrows')),
+                ('penalty_revenue', models.BigIntegerField(default=0, verbose_name='penalty revenue')),
+            ],
+            options={
+                'verbose_name': 'circulation statistic',
+                'verbose_name_plural': 'circulation statistics',
+                'unique_together': {('dimension', 'month', 'key')},
+            },
+        ),
+    ]
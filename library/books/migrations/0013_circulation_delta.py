@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_circulation_stat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CirculationDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='month')),
+                ('book_id', models.IntegerField(verbose_name='book')),
+                ('borrows', models.IntegerField(default=0, verbose_name='number of borrows')),
+                ('penalty_revenue', models.BigIntegerField(default=0, verbose_name='penalty revenue')),
+            ],
+            options={
+                'verbose_name': 'circulation delta',
+                'verbose_name_plural': 'circulation deltas',
+            },
+        ),
+        migrations.AddField(
+            model_name='circulationstat',
+            name='attribution',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='attribution'),
+        ),
+    ]
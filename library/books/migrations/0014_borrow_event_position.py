@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:26
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def position_events(apps, schema_editor):
+    BorrowEvent = apps.get_model('books', 'BorrowEvent')
+    BorrowEvent.objects.update(position=F('id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_circulation_delta'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='borrowevent',
+            name='books_borro_student_3de8e2_idx',
+        ),
+        migrations.AddField(
+            model_name='borrowevent',
+            name='position',
+            field=models.BigIntegerField(editable=False, null=True, unique=True, verbose_name='position'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowevent',
+            index=models.Index(fields=['student_id', 'position'], name='books_borro_student_0252d3_idx'),
+        ),
+        migrations.RunPython(position_events, migrations.RunPython.noop),
+    ]
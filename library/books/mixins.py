@@ -0,0 +1,324 @@
+import csv
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.response import Response
+
+from library.books import cache as catalog_cache
+from library.books import replicas
+
+
+def _follow(model, source):
+    """Return the relation lookup, multiplicity and target model of a dotted source."""
+    lookups, many = [], False
+    for name in source.split("."):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            break
+        if not field.is_relation:
+            break
+        lookups.append(name)
+        many = many or field.many_to_many or field.one_to_many
+        model = field.related_model
+    return "__".join(lookups), many, model
+
+
+def plan_lookups(serializer, model, prefix="", many=False):
+    """Collect the ``select_related`` and ``prefetch_related`` lookups needed to render ``serializer``."""
+    select, prefetch = set(), set()
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue
+        lookup, field_many, related_model = _follow(model, field.source)
+        if not lookup:
+            continue
+        field_many = many or field_many
+        if isinstance(field, serializers.ListSerializer):
+            field, field_many = field.child, True
+        if isinstance(field, ManyRelatedField):
+            field_many = True
+        elif (
+            isinstance(field, RelatedField)
+            and field.use_pk_only_optimization()
+            and lookup == field.source
+            and not field_many
+        ):
+            continue
+        path = prefix + lookup
+        (prefetch if field_many else select).add(path)
+        if isinstance(field, serializers.BaseSerializer):
+            nested_select, nested_prefetch = plan_lookups(
+                field, related_model, f"{path}__", field_many
+            )
+            select |= nested_select
+            prefetch |= nested_prefetch
+    return select, prefetch
+
+
+class QueryPlanMixin:
+    """Join or prefetch whatever the serializer of the current action renders."""
+
+    def plan_queryset(self, queryset):
+        select, prefetch = plan_lookups(self.get_serializer(), queryset.model)
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        return queryset
+
+    def get_queryset(self):
+        return self.plan_queryset(super(QueryPlanMixin, self).get_queryset())
+
+
+class ValuesListMixin:
+    """Render list pages from ``values()`` rows when ``values_serializer_class`` is set."""
+
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None:
+            return super(ValuesListMixin, self).list(request, *args, **kwargs)
+        serializer = self.values_serializer_class(context=self.get_serializer_context())
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        rows = queryset.values(*serializer.columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(list(rows)))
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ExportMixin:
+    """Stream the filtered list as CSV or NDJSON without paginating it."""
+
+    export_fields = ()
+    export_chunk_size = 2000
+
+    def export_rows(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        return (
+            queryset.prefetch_related(None)
+            .order_by("pk")
+            .values(*self.export_fields)
+            .iterator(chunk_size=self.export_chunk_size)
+        )
+
+    def stream_csv(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.export_fields)
+        for row in rows:
+            yield writer.writerow(
+                "" if value is None else value
+                for value in (row[field] for field in self.export_fields)
+            )
+
+    def stream_ndjson(self, rows):
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+    @action(
+        methods=("GET",),
+        detail=False,
+        url_path="export/(?P<export_format>csv|ndjson)",
+        url_name="export",
+    )
+    def export(self, request, export_format, *args, **kwargs):
+        if export_format == "csv":
+            content, content_type = self.stream_csv(self.export_rows()), "text/csv"
+        else:
+            content = self.stream_ndjson(self.export_rows())
+            content_type = "application/x-ndjson"
+        response = StreamingHttpResponse(content, content_type=content_type)
+        filename = f"{self.basename}.{export_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class CatalogCacheMixin:
+    """Serve list and retrieve responses from the versioned catalog cache.
+
+    The ``validators`` of a response, if any, are cached along with its data.
+    Data which changes too often to be invalidated on is refreshed on every
+    hit by ``refresh_cached``.
+    """
+
+    cache_namespace = None
+    validators = None
+
+    def get_cache_namespace(self):
+        return self.cache_namespace
+
+    def refresh_cached(self, data):
+        pass
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        cache = catalog_cache.get_cache()
+        key = catalog_cache.response_key(
+            self.get_cache_namespace(),
+            request.build_absolute_uri(),
+            get_language(),
+            request.accepted_renderer.format,
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            catalog_cache.record("hits")
+            data, self.validators = cached
+            self.refresh_cached(data)
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+        response = handler(request, *args, **kwargs)
+        # Shared by everyone for CATALOG_CACHE_TIMEOUT under the generation read
+        # above, so never filled from a replica which may lag behind it.
+        if (
+            response.status_code == status.HTTP_200_OK
+            and replicas.replica_alias() is None
+        ):
+            cache.set(
+                key, (response.data, self.validators), settings.CATALOG_CACHE_TIMEOUT
+            )
+        catalog_cache.record("misses")
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        handler = super(CatalogCacheMixin, self).list
+        return self.cached_response(handler, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        handler = super(CatalogCacheMixin, self).retrieve
+        return self.cached_response(handler, request, *args, **kwargs)
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        super(NotModified, self).__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Answer list and retrieve requests with 304 while the client copy is current.
+
+    Validators are derived from the rows being served, i.e. the page (with
+    its count and next link) or the object, before anything is serialized,
+    so a 304 costs no more queries than the page itself. Cached catalog
+    responses keep their validators, refreshed along with their data.
+    """
+
+    modified_field = "updated_at"
+    validators = None
+
+    def set_validators(self, rows):
+        modified, keys = None, []
+        for row in rows:
+            if isinstance(row, dict):
+                pk, updated = row["id"], row[self.modified_field]
+            else:
+                pk, updated = row.pk, getattr(row, self.modified_field)
+            keys.append(str(pk))
+            modified = updated if modified is None else max(modified, updated)
+        parts = [",".join(keys)]
+        if self.action == "list":
+            parts += [
+                getattr(self.paginator, "count", None),
+                self.paginator.get_next_link(),
+            ]
+        self.validators = (modified, "|".join(map(str, parts)))
+        response = self.not_modified_response(self.request)
+        if response is not None:
+            raise NotModified(response)
+
+    def get_conditional_headers(self, request):
+        modified, rows = self.validators
+        version = "|".join(
+            str(part)
+            for part in (
+                request.get_full_path(),
+                request.user.pk,
+                get_language(),
+                modified and modified.isoformat(),
+                rows,
+            )
+        )
+        etag = quote_etag(hashlib.md5(version.encode()).hexdigest())
+        return etag, modified and int(modified.timestamp())
+
+    def not_modified_response(self, request):
+        etag, last_modified = self.get_conditional_headers(request)
+        return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    def paginate_queryset(self, queryset):
+        page = super(ConditionalGetMixin, self).paginate_queryset(queryset)
+        if page is not None and self.action == "list":
+            self.set_validators(page)
+        return page
+
+    def get_object(self):
+        obj = super(ConditionalGetMixin, self).get_object()
+        if self.action == "retrieve":
+            self.set_validators([obj])
+        return obj
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        self.validators = None
+        try:
+            response = handler(request, *args, **kwargs)
+        except NotModified as exc:
+            response = exc.response
+        if self.validators is None:
+            return response
+        if response.status_code == status.HTTP_200_OK:
+            # Served from the catalog cache, without coming across the rows.
+            response = self.not_modified_response(request) or response
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            etag, last_modified = self.get_conditional_headers(request)
+            response["ETag"] = etag
+            if last_modified:
+                response["Last-Modified"] = http_date(last_modified)
+            # The validators depend on the user, however authenticated, and
+            # on the language.
+            patch_vary_headers(response, ("Authorization", "Cookie", "Accept-Language"))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        handler = super(ConditionalGetMixin, self).list
+        return self.conditional_response(handler, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        handler = super(ConditionalGetMixin, self).retrieve
+        return self.conditional_response(handler, request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """Read safe requests from a replica, unless the user wrote recently.
+
+    The replica is only used once the request is authenticated and allowed,
+    so users and permissions are always read from the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super(ReplicaReadMixin, self).initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            replicas.read_from_replica(request.user.pk)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super(ReplicaReadMixin, self).dispatch(request, *args, **kwargs)
+        finally:
+            replicas.read_from_primary()
@@ -1,13 +1,25 @@
+import datetime
+
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinLengthValidator
 from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest, Now
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from library.books import cache as catalog_cache
+
 
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True, verbose_name=_("name"))
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+        verbose_name=_("modification date"),
+    )
 
     class Meta:
         verbose_name = _("tag")
@@ -17,6 +29,39 @@ class Tag(models.Model):
         return self.name
 
 
+class BookQuerySet(models.QuerySet):
+    def available(self):
+        return self.filter(out_copies__lt=models.F("copies"))
+
+    def take_copy(self):
+        return self.available().update(
+            out_copies=models.F("out_copies") + 1, updated_at=Now()
+        )
+
+    def release_copy(self):
+        return self.filter(out_copies__gt=0).update(
+            out_copies=models.F("out_copies") - 1, updated_at=Now()
+        )
+
+    def touch(self):
+        return self.update(updated_at=Now())
+
+    def reconcile_out_copies(self):
+        open_borrows = (
+            Borrow.objects.filter(book=models.OuterRef("pk"), returned_at__isnull=True)
+            .order_by()
+            .values("book")
+            .annotate(count=models.Count("pk"))
+            .values("count")
+        )
+        actual = Coalesce(models.Subquery(open_borrows), 0)
+        fixed = self.exclude(out_copies=actual).update(
+            out_copies=actual, updated_at=Now()
+        )
+        catalog_cache.invalidate(catalog_cache.AVAILABILITY)
+        return fixed
+
+
 class Book(models.Model):
     TYPE_RESOURCE = "R"
     TYPE_ARTICLE = "A"
@@ -40,6 +85,17 @@ class Book(models.Model):
     type = models.CharField(max_length=1, choices=TYPE_CHOICES, verbose_name=_("type"))
     tags = models.ManyToManyField(Tag, verbose_name=_("tags"))
     copies = models.PositiveSmallIntegerField(verbose_name=_("number of copies"))
+    out_copies = models.PositiveSmallIntegerField(
+        default=0, editable=False, verbose_name=_("number of copies out")
+    )
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+        verbose_name=_("modification date"),
+    )
+
+    objects = BookQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("book")
@@ -50,19 +106,14 @@ class Book(models.Model):
 
     @property
     def is_available(self):
-        out_copies = self.borrow_set.select_for_update().filter(
-            returned_at__isnull=True
-        )
-        return out_copies.count() < self.copies
+        return self.out_copies < self.copies
 
     @property
     def related_books(self):
         return (
-            Book.objects.exclude(pk=self.pk)
-            .filter(type=self.type, tags__in=self.tags.all())
-            .annotate(score=models.Count("pk"))
-            .distinct()
-            .order_by("-score")
+            Book.objects.filter(related_by__book=self)
+            .annotate(score=models.F("related_by__score"))
+            .order_by("-score", "pk")
         )
 
     @property
@@ -70,10 +121,116 @@ class Book(models.Model):
         return dict(self.TYPE_CHOICES).get(self.type)
 
 
+class RelatedBook(models.Model):
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name="related_entries",
+        verbose_name=_("book"),
+    )
+    related = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name="related_by",
+        verbose_name=_("related book"),
+    )
+    score = models.PositiveIntegerField(verbose_name=_("score"))
+
+    class Meta:
+        verbose_name = _("related book")
+        verbose_name_plural = _("related books")
+        unique_together = ("book", "related")
+        indexes = (models.Index(fields=("book", "-score", "related")),)
+
+    def __str__(self):
+        return f"{self.book} -> {self.related} ({self.score})"
+
+
+class BookSearchToken(models.Model):
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name="search_tokens",
+        verbose_name=_("book"),
+    )
+    token = models.CharField(max_length=3, verbose_name=_("token"))
+    weight = models.PositiveSmallIntegerField(verbose_name=_("weight"))
+
+    class Meta:
+        verbose_name = _("search token")
+        verbose_name_plural = _("search tokens")
+        unique_together = ("book", "token")
+        indexes = (models.Index(fields=("token", "book")),)
+
+    def __str__(self):
+        return f"{self.book}: {self.token!r}"
+
+
+class DateRangeQuerySetMixin:
+    """List the periods between the first and last dates of a field, for the admin date hierarchy.
+
+    The range comes from two index lookups instead of a ``DISTINCT`` over
+    every row, so periods without rows may be listed too.
+    """
+
+    def datetimes(self, field_name, kind, order="ASC", tzinfo=None):
+        bounds = self.aggregate(
+            first=models.Min(field_name), last=models.Max(field_name)
+        )
+        if bounds["first"] is None:
+            return []
+        first, last = (timezone.localtime(bounds[name]) for name in ("first", "last"))
+        current = first.replace(hour=0, minute=0, second=0, microsecond=0)
+        if kind in ("year", "month"):
+            current = current.replace(day=1)
+        if kind == "year":
+            current = current.replace(month=1)
+        periods = []
+        while current <= last:
+            periods.append(current)
+            if kind == "year":
+                current = current.replace(year=current.year + 1)
+            elif kind == "month":
+                current = current.replace(
+                    year=current.year + current.month // 12,
+                    month=current.month % 12 + 1,
+                )
+            else:
+                current += datetime.timedelta(days=1)
+        return periods if order == "ASC" else periods[::-1]
+
+
+class BorrowQuerySet(DateRangeQuerySetMixin, models.QuerySet):
+    def open(self):
+        return self.filter(returned_at__isnull=True)
+
+    def overdue(self, now=None):
+        """Open borrows whose duration ended before the current day, in one SQL predicate."""
+        today = (now or timezone.now()).astimezone(datetime.timezone.utc).date()
+        tomorrow = datetime.datetime.combine(
+            today + datetime.timedelta(days=1), datetime.time(), datetime.timezone.utc
+        )
+        duration = models.ExpressionWrapper(
+            models.F("duration") * models.Value(datetime.timedelta(days=1)),
+            output_field=models.DurationField(),
+        )
+        due = models.ExpressionWrapper(
+            models.F("borrowed_at") + duration, output_field=models.DateTimeField()
+        )
+        return (
+            self.open()
+            .filter(borrowed_at__isnull=False, duration__isnull=False)
+            .alias(due=due)
+            .filter(due__lt=tomorrow)
+        )
+
+
 class Borrow(models.Model):
+    # Led by books_borrow_student_idx.
     student = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         limit_choices_to={"groups__name": "Student"},
         verbose_name=_("student"),
     )
@@ -88,20 +245,66 @@ class Borrow(models.Model):
     returned_at = models.DateTimeField(
         null=True, blank=True, verbose_name=_("return date")
     )
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+        verbose_name=_("modification date"),
+    )
 
     class Meta:
         verbose_name = _("borrow")
         verbose_name_plural = _("borrows")
+        indexes = (
+            models.Index(fields=("requested_at", "id")),
+            models.Index(
+                fields=("student", "requested_at", "id"),
+                name="books_borrow_student_idx",
+            ),
+            # Open borrows are a small fraction of the table, looked up per
+            # student, per book and (for delay penalties) in primary key order.
+            models.Index(
+                fields=("student",),
+                condition=models.Q(returned_at__isnull=True),
+                name="books_borrow_open_student_idx",
+            ),
+            models.Index(
+                fields=("book",),
+                condition=models.Q(returned_at__isnull=True),
+                name="books_borrow_open_book_idx",
+            ),
+            models.Index(
+                fields=("id",),
+                condition=models.Q(returned_at__isnull=True, borrowed_at__isnull=False),
+                name="books_borrow_out_idx",
+            ),
+        )
 
     def __str__(self):
         return f"{self.student.get_full_name()}: {self.book}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        borrow = super(Borrow, cls).from_db(db, field_names, values)
+        borrow._loaded_values = dict(zip(field_names, values))
+        return borrow
+
+    def _loaded(self, field_name):
+        if self._state.adding:
+            return None
+        return getattr(self, "_loaded_values", {}).get(field_name)
+
+    objects = BorrowQuerySet.as_manager()
+
+    @staticmethod
+    def count_out_days(borrowed_at, ending):
+        return (ending.date() - borrowed_at.date()).days + 1
+
     @property
     def out_days(self):
         if not self.borrowed_at:
             return 0
-        ending = self.returned_at or timezone.now()
-        return (ending.date() - self.borrowed_at.date()).days + 1
+        return self.count_out_days(self.borrowed_at, self.returned_at or timezone.now())
 
     @property
     def is_overdue(self):
@@ -110,13 +313,10 @@ class Borrow(models.Model):
         return self.out_days > self.duration
 
     def clean_student(self):
-        already_borrowed = self.student.borrow_set.filter(returned_at__isnull=True)
-        if already_borrowed.exists():
+        standing = StudentStanding.objects.filter(pk=self.student_id).first()
+        if standing and standing.open_borrows:
             raise ValidationError(_("You have not returned previously borrowed book."))
-        unpaid_penalties = DelayPenalty.objects.filter(
-            borrow__student=self.student, is_paid=False
-        )
-        if unpaid_penalties.exists():
+        if standing and standing.unpaid_penalties:
             raise ValidationError(_("You has an unpaid delay penalty."))
 
     def clean_book(self):
@@ -124,18 +324,84 @@ class Borrow(models.Model):
             raise ValidationError(_("No copy of this book is available right now."))
 
     def clean(self):
+        # The standing of the student is checked by the guarded take_borrow of
+        # update_standing, and only read to explain a refusal.
         if not self.pk:
-            self.clean_student()
             self.clean_book()
 
+    def update_out_copies(self):
+        was_out = None if self._loaded("returned_at") else self._loaded("book_id")
+        is_out = self.book_id if self.returned_at is None else None
+        if was_out == is_out:
+            return
+        if is_out and not Book.objects.filter(pk=is_out).take_copy():
+            raise ValidationError(_("No copy of this book is available right now."))
+        if was_out:
+            Book.objects.filter(pk=was_out).release_copy()
+        catalog_cache.invalidate(catalog_cache.AVAILABILITY)
+
+    def update_standing(self):
+        was_open = None if self._loaded("returned_at") else self._loaded("student_id")
+        is_open = self.student_id if self.returned_at is None else None
+        if was_open == is_open:
+            return
+        if is_open and not StudentStanding.objects.take_borrow(
+            is_open, guarded=self._state.adding
+        ):
+            self.clean_student()
+            raise ValidationError(_("You have not returned previously borrowed book."))
+        if was_open:
+            StudentStanding.objects.filter(pk=was_open).release_borrow()
+
+    def event_kind(self):
+        if self._state.adding:
+            return BorrowEvent.KIND_REQUESTED
+        if self.returned_at and not self._loaded("returned_at"):
+            return BorrowEvent.KIND_RETURNED
+        if self.borrowed_at and not self._loaded("borrowed_at"):
+            return BorrowEvent.KIND_STARTED
+        return BorrowEvent.KIND_CHANGED
+
+    def update_circulation(self):
+        was_out = (
+            CirculationStat.month_of(self._loaded("borrowed_at")),
+            self._loaded("book_id"),
+        )
+        is_out = CirculationStat.month_of(self.borrowed_at), self.book_id
+        if was_out == is_out:
+            return
+        CirculationDelta.record(*was_out, borrows=-1)
+        CirculationDelta.record(*is_out, borrows=1)
+
     @transaction.atomic
     def save(self, *args, **kwargs):
         self.clean()
+        self.update_standing()
+        self.update_out_copies()
+        self.update_circulation()
+        kind = self.event_kind()
         super(Borrow, self).save(*args, **kwargs)
+        BorrowEvent.objects.create(**BorrowEvent.for_borrow(self, kind))
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
         if self.is_overdue:
-            DelayPenalty.objects.get_or_create(
-                borrow=self, defaults={"amount": (self.out_days - self.duration) * 1000, "is_paid": False}
+            amount = DelayPenalty.amount_for(self.out_days, self.duration)
+            penalty, created = DelayPenalty.objects.get_or_create(
+                borrow=self, defaults={"amount": amount, "is_paid": False}
             )
+            if not created and not penalty.is_paid and penalty.amount != amount:
+                DelayPenalty.objects.filter(pk=penalty.pk).update(amount=amount)
+                StudentStanding.objects.add_unpaid(
+                    self.student_id, amount=amount - penalty.amount
+                )
+                penalty.amount = amount
+                BorrowEvent.objects.create(
+                    **BorrowEvent.for_penalty(
+                        penalty, self.student_id, BorrowEvent.KIND_PENALTY_CHANGED
+                    )
+                )
 
 
 class DelayPenalty(models.Model):
@@ -145,9 +411,415 @@ class DelayPenalty(models.Model):
     amount = models.PositiveIntegerField(editable=False, verbose_name=_("amount"))
     is_paid = models.BooleanField(verbose_name=_("is it paid?"))
 
+    AMOUNT_PER_DAY = 1000
+
     class Meta:
         verbose_name = _("delay penalty")
         verbose_name_plural = _("delay  penalties")
+        indexes = (
+            models.Index(
+                fields=("id",),
+                condition=models.Q(is_paid=False),
+                name="books_penalty_unpaid_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.borrow} ({self.amount})"
+
+    @classmethod
+    def amount_for(cls, out_days, duration):
+        return (out_days - duration) * cls.AMOUNT_PER_DAY
+
+    @property
+    def revenue(self):
+        return self.amount if self.is_paid else 0
+
+    @staticmethod
+    def counts(amount, is_paid):
+        """Return the revenue, unpaid penalties and unpaid amount a penalty counts for."""
+        return (amount, 0, 0) if is_paid else (0, 1, amount)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        penalty = super(DelayPenalty, cls).from_db(db, field_names, values)
+        if {"amount", "is_paid"} <= set(field_names):
+            penalty._loaded_state = (penalty.amount, penalty.is_paid)
+        return penalty
+
+    def refresh_from_db(self, *args, **kwargs):
+        super(DelayPenalty, self).refresh_from_db(*args, **kwargs)
+        self._loaded_state = None
+
+    def loaded_counts(self):
+        """Return the ``counts`` of the penalty as saved, nothing when adding it."""
+        if self._state.adding:
+            return 0, 0, 0
+        state = getattr(self, "_loaded_state", None)
+        if state is None:
+            state = (
+                DelayPenalty.objects.filter(pk=self.pk)
+                .values_list("amount", "is_paid")
+                .first()
+            ) or (0, True)
+        return self.counts(*state)
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        revenue, penalties, amount = self.loaded_counts()
+        super(DelayPenalty, self).save(*args, **kwargs)
+        self._loaded_state = (self.amount, self.is_paid)
+        if DelayPenalty.borrow.is_cached(self):
+            borrow = self.borrow
+            student_id, borrowed_at, book_id = (
+                borrow.student_id,
+                borrow.borrowed_at,
+                borrow.book_id,
+            )
+        else:
+            student_id, borrowed_at, book_id = (
+                Borrow.objects.filter(pk=self.borrow_id)
+                .values_list("student", "borrowed_at", "book")
+                .get()
+            )
+        counts = self.counts(self.amount, self.is_paid)
+        CirculationDelta.record(
+            CirculationStat.month_of(borrowed_at),
+            book_id,
+            penalty_revenue=counts[0] - revenue,
+        )
+        StudentStanding.objects.add_unpaid(
+            student_id, penalties=counts[1] - penalties, amount=counts[2] - amount
+        )
+        kind = (
+            BorrowEvent.KIND_PENALIZED if created else BorrowEvent.KIND_PENALTY_CHANGED
+        )
+        BorrowEvent.objects.create(**BorrowEvent.for_penalty(self, student_id, kind))
+
+
+class BorrowEvent(models.Model):
+    """Append-only log of borrow and delay penalty changes.
+
+    Events are written in the transaction of the change and carry the state
+    of the borrow (or of its penalty) after it, so consumers only need the
+    latest event of each kind per borrow. Their ``position`` in the feed is
+    given once they are committed (see ``library.books.feed``).
+    """
+
+    KIND_REQUESTED = "requested"
+    KIND_STARTED = "started"
+    KIND_RETURNED = "returned"
+    KIND_CHANGED = "changed"
+    KIND_DELETED = "deleted"
+    KIND_PENALIZED = "penalized"
+    KIND_PENALTY_CHANGED = "penalty_changed"
+    KIND_PENALTY_DELETED = "penalty_deleted"
+    KIND_CHOICES = (
+        (KIND_REQUESTED, _("requested")),
+        (KIND_STARTED, _("started")),
+        (KIND_RETURNED, _("returned")),
+        (KIND_CHANGED, _("changed")),
+        (KIND_DELETED, _("deleted")),
+        (KIND_PENALIZED, _("penalized")),
+        (KIND_PENALTY_CHANGED, _("penalty changed")),
+        (KIND_PENALTY_DELETED, _("penalty deleted")),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name=_("kind"))
+    borrow_id = models.BigIntegerField(verbose_name=_("borrow"))
+    student_id = models.IntegerField(verbose_name=_("student"))
+    data = models.JSONField(encoder=DjangoJSONEncoder, verbose_name=_("data"))
+    created_at = models.DateTimeField(
+        default=timezone.now, editable=False, verbose_name=_("creation date")
+    )
+    position = models.BigIntegerField(
+        null=True, unique=True, editable=False, verbose_name=_("position")
+    )
+
+    class Meta:
+        verbose_name = _("borrow event")
+        verbose_name_plural = _("borrow events")
+        indexes = (models.Index(fields=("student_id", "position")),)
+
+    def __str__(self):
+        return f"{self.pk}: {self.kind} {self.borrow_id}"
+
+    @staticmethod
+    def for_borrow(borrow, kind):
+        """Return the fields of an event about ``borrow``."""
+        return {
+            "kind": kind,
+            "borrow_id": borrow.pk,
+            "student_id": borrow.student_id,
+            "data": {
+                "book": borrow.book_id,
+                "requested_at": borrow.requested_at,
+                "borrowed_at": borrow.borrowed_at,
+                "duration": borrow.duration,
+                "returned_at": borrow.returned_at,
+            },
+        }
+
+    @staticmethod
+    def for_penalty(penalty, student_id, kind):
+        """Return the fields of an event about ``penalty``."""
+        return {
+            "kind": kind,
+            "borrow_id": penalty.borrow_id,
+            "student_id": student_id,
+            "data": {
+                "amount": penalty.amount,
+                "is_paid": penalty.is_paid,
+            },
+        }
+
+
+class StudentStandingQuerySet(models.QuerySet):
+    def take_borrow(self, student_id, guarded=True):
+        """Count a new open borrow, unless the student (when ``guarded``) may not borrow."""
+        standings = self.filter(pk=student_id)
+        if guarded:
+            standings = standings.filter(open_borrows=0, unpaid_penalties=0)
+        increment = {"open_borrows": models.F("open_borrows") + 1}
+        if standings.update(**increment):
+            return True
+        if self.filter(pk=student_id).exists():
+            return False
+        self.bulk_create(
+            [StudentStanding(student_id=student_id)], ignore_conflicts=True
+        )
+        return bool(standings.update(**increment))
+
+    def release_borrow(self):
+        return self.filter(open_borrows__gt=0).update(
+            open_borrows=models.F("open_borrows") - 1
+        )
+
+    def add_unpaid(self, student_id, penalties=0, amount=0):
+        """Add to the unpaid penalties and amount of a student; both may be negative."""
+        if not penalties and not amount:
+            return False
+        standings = self.filter(pk=student_id)
+        changes = {
+            "unpaid_penalties": Greatest(models.F("unpaid_penalties") + penalties, 0),
+            "unpaid_amount": Greatest(models.F("unpaid_amount") + amount, 0),
+        }
+        if standings.update(**changes):
+            return True
+        self.bulk_create(
+            [StudentStanding(student_id=student_id)], ignore_conflicts=True
+        )
+        return bool(standings.update(**changes))
+
+    def reconcile(self, student_ids=None):
+        """Recompute the standing of the given (or all) students from borrows and penalties."""
+        borrowers = Borrow.objects.order_by().values("student")
+        if student_ids is not None:
+            borrowers = borrowers.filter(student__in=student_ids)
+        self.bulk_create(
+            (
+                StudentStanding(student_id=student_id)
+                for student_id in borrowers.distinct().values_list("student", flat=True)
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+        def aggregate(queryset, function):
+            return Coalesce(
+                models.Subquery(
+                    queryset.order_by()
+                    .values("student")
+                    .annotate(value=function)
+                    .values("value")
+                ),
+                0,
+            )
+
+        student = models.OuterRef("student")
+        penalties = DelayPenalty.objects.filter(
+            borrow__student=student, is_paid=False
+        ).values(student=models.F("borrow__student"))
+        actual = {
+            "open_borrows": aggregate(
+                Borrow.objects.open().filter(student=student), models.Count("pk")
+            ),
+            "unpaid_penalties": aggregate(penalties, models.Count("pk")),
+            "unpaid_amount": aggregate(penalties, models.Sum("amount")),
+        }
+        standings = self if student_ids is None else self.filter(pk__in=student_ids)
+        return standings.exclude(**actual).update(**actual)
+
+
+class StudentStanding(models.Model):
+    student = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="standing",
+        verbose_name=_("student"),
+    )
+    open_borrows = models.PositiveIntegerField(
+        default=0, verbose_name=_("number of open borrows")
+    )
+    unpaid_penalties = models.PositiveIntegerField(
+        default=0, verbose_name=_("number of unpaid delay penalties")
+    )
+    unpaid_amount = models.PositiveBigIntegerField(
+        default=0, verbose_name=_("unpaid amount")
+    )
+
+    objects = StudentStandingQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("student standing")
+        verbose_name_plural = _("student standings")
+
+    def __str__(self):
+        return str(self.student)
+
+
+class ArchivedBorrow(models.Model):
+    """Borrow returned long ago, moved out of the live table by ``archive_borrows``.
+
+    Keeps the id it had as a ``Borrow``, so ids stay unique across both tables.
+    """
+
+    id = models.BigIntegerField(primary_key=True, verbose_name=_("ID"))
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="archived_borrows",
+        verbose_name=_("student"),
+    )
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name="archived_borrows",
+        verbose_name=_("book"),
+    )
+    requested_at = models.DateTimeField(verbose_name=_("request date"))
+    borrowed_at = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("borrow date")
+    )
+    duration = models.IntegerField(null=True, blank=True, verbose_name=_("duration"))
+    returned_at = models.DateTimeField(verbose_name=_("return date"))
+    archived_at = models.DateTimeField(
+        default=timezone.now, editable=False, verbose_name=_("archive date")
+    )
+
+    class Meta:
+        verbose_name = _("archived borrow")
+        verbose_name_plural = _("archived borrows")
+        indexes = (
+            models.Index(
+                fields=("student", "requested_at", "id"),
+                name="books_archived_student_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.student}: {self.book}"
+
+
+class ArchivedDelayPenalty(models.Model):
+    borrow = models.OneToOneField(
+        ArchivedBorrow,
+        on_delete=models.CASCADE,
+        related_name="penalty",
+        verbose_name=_("borrow"),
+    )
+    amount = models.PositiveIntegerField(verbose_name=_("amount"))
+    is_paid = models.BooleanField(verbose_name=_("is it paid?"))
+
+    class Meta:
+        verbose_name = _("archived delay penalty")
+        verbose_name_plural = _("archived delay penalties")
 
     def __str__(self):
         return f"{self.borrow} ({self.amount})"
+
+
+class CirculationStat(models.Model):
+    """Borrows started in a month, and the paid penalties of those borrows.
+
+    Rolled up in total and per book, book type and tag. Each book and month
+    is counted under the type and tags the book had when the month was first
+    counted (or last rebuilt), which its book row keeps in ``attribution``.
+    Borrows and penalties record changes as ``CirculationDelta`` rows, folded
+    in by ``update_circulation_stats``; ``rebuild_circulation_stats``
+    recounts everything under the current types and tags.
+    """
+
+    DIMENSION_TOTAL = "total"
+    DIMENSION_TYPE = "type"
+    DIMENSION_TAG = "tag"
+    DIMENSION_BOOK = "book"
+    DIMENSION_CHOICES = (
+        (DIMENSION_TOTAL, _("total")),
+        (DIMENSION_TYPE, _("type")),
+        (DIMENSION_TAG, _("tag")),
+        (DIMENSION_BOOK, _("book")),
+    )
+
+    month = models.DateField(verbose_name=_("month"))
+    dimension = models.CharField(
+        max_length=5, choices=DIMENSION_CHOICES, verbose_name=_("dimension")
+    )
+    key = models.CharField(max_length=20, blank=True, verbose_name=_("key"))
+    borrows = models.IntegerField(default=0, verbose_name=_("number of borrows"))
+    penalty_revenue = models.BigIntegerField(
+        default=0, verbose_name=_("penalty revenue")
+    )
+    attribution = models.JSONField(
+        default=list, blank=True, editable=False, verbose_name=_("attribution")
+    )
+
+    class Meta:
+        verbose_name = _("circulation statistic")
+        verbose_name_plural = _("circulation statistics")
+        unique_together = ("dimension", "month", "key")
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.dimension} {self.key}: {self.borrows}"
+
+    @staticmethod
+    def month_of(moment):
+        if moment is None:
+            return None
+        return timezone.localdate(moment).replace(day=1)
+
+
+class CirculationDelta(models.Model):
+    """Change to the circulation rollups of a book, recorded along with the change itself.
+
+    Only ever inserted by borrows and penalties, so that they do not wait on
+    each other for the rollups, which are only written by the jobs.
+    """
+
+    month = models.DateField(verbose_name=_("month"))
+    book_id = models.IntegerField(verbose_name=_("book"))
+    borrows = models.IntegerField(default=0, verbose_name=_("number of borrows"))
+    penalty_revenue = models.BigIntegerField(
+        default=0, verbose_name=_("penalty revenue")
+    )
+
+    class Meta:
+        verbose_name = _("circulation delta")
+        verbose_name_plural = _("circulation deltas")
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.book_id}: {self.borrows:+d}"
+
+    @classmethod
+    def record(cls, month, book_id, borrows=0, penalty_revenue=0):
+        """Count changes of a borrow started in ``month``, if it is started at all."""
+        if month and (borrows or penalty_revenue):
+            cls.objects.create(
+                month=month,
+                book_id=book_id,
+                borrows=borrows,
+                penalty_revenue=penalty_revenue,
+            )
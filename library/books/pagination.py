@@ -0,0 +1,118 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    page_size_query_param = "limit"
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+
+class LibraryPagination(LimitOffsetPagination):
+    """Limit/offset pagination with an opt-out total count and a keyset mode.
+
+    ``?count=false`` skips the ``COUNT(*)`` query and reports ``count`` as
+    null. Passing a ``cursor`` parameter (empty for the first page) to a list
+    action of a view that declares ``cursor_ordering`` walks the results by
+    that ordering instead, so that deep pages cost the same as the first one.
+    """
+
+    count_query_param = "count"
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.with_count = request.query_params.get(
+            self.count_query_param, ""
+        ).lower() not in ("false", "0", "no")
+        self.keyset = None
+        ordering = getattr(view, "cursor_ordering", None)
+        if (
+            ordering
+            and getattr(view, "action", None) == "list"
+            and self.cursor_query_param in request.query_params
+        ):
+            self.keyset = KeysetPagination(ordering)
+            self.count = self.get_count(queryset) if self.with_count else None
+            return self.keyset.paginate_queryset(queryset, request, view)
+        if self.with_count:
+            return super(LibraryPagination, self).paginate_queryset(
+                queryset, request, view
+            )
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.count = None
+        self.offset = self.get_offset(request)
+        page = list(queryset[self.offset : self.offset + self.limit + 1])
+        self.has_more = len(page) > self.limit
+        return page[: self.limit]
+
+    def get_next_link(self):
+        if self.keyset:
+            return self.keyset.get_next_link()
+        if self.count is not None:
+            return super(LibraryPagination, self).get_next_link()
+        if not self.has_more:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit
+        )
+
+    def get_previous_link(self):
+        if self.keyset:
+            return self.keyset.get_previous_link()
+        return super(LibraryPagination, self).get_previous_link()
+
+
+# Row count estimates kept by the database statistics, per vendor.
+ESTIMATED_COUNTS = {
+    "postgresql": "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)",
+    "mysql": (
+        "SELECT table_rows FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name = %s"
+    ),
+}
+
+
+def estimate_count(model, using):
+    """Estimate the number of rows of ``model`` without scanning its table."""
+    connection = connections[using]
+    row = None
+    if connection.vendor in ESTIMATED_COUNTS:
+        with connection.cursor() as cursor:
+            cursor.execute(ESTIMATED_COUNTS[connection.vendor], [model._meta.db_table])
+            row = cursor.fetchone()
+    if row and row[0] is not None and row[0] >= 0:
+        return int(row[0])
+    # Without statistics, the largest key is an upper bound read from the index.
+    return model._base_manager.using(using).aggregate(last=Max("pk"))["last"] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Django paginator which stops counting exactly past ``exact_count_limit`` rows.
+
+    Larger results are estimated from table statistics when unfiltered, and
+    capped at the limit otherwise, so that no page needs a full ``COUNT(*)``.
+    """
+
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = self.exact_count_limit
+        count = queryset.order_by()[: limit + 1].count()
+        if count <= limit:
+            return count
+        if queryset.query.has_filters():
+            return limit
+        return max(estimate_count(queryset.model, queryset.db), count)
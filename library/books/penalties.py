@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.utils import timezone
+
+from library.books.models import Borrow, BorrowEvent, DelayPenalty, StudentStanding
+
+
+def apply_delay_penalties(now=None, chunk_size=1000):
+    """Create or refresh the penalty of every overdue open borrow.
+
+    Borrows are walked by primary key in chunks, and each chunk is written
+    with one ``bulk_create`` and one ``bulk_update``. Paid penalties are left
+    alone and unchanged amounts are not rewritten, so running it again the
+    same day touches nothing. The standings of the charged students are
+    reconciled, and borrow events recorded, along with each chunk. Returns
+    the number of created and updated penalties.
+    """
+    now = now or timezone.now()
+    overdue = Borrow.objects.overdue(now).order_by("pk")
+    created = updated = 0
+    last = 0
+    while True:
+        chunk = list(
+            overdue.filter(pk__gt=last).values_list(
+                "pk",
+                "student",
+                "borrowed_at",
+                "duration",
+                "delaypenalty__pk",
+                "delaypenalty__amount",
+                "delaypenalty__is_paid",
+            )[:chunk_size]
+        )
+        if not chunk:
+            return created, updated
+        last = chunk[-1][0]
+        new, stale, events, students = [], [], [], set()
+        for (
+            borrow_id,
+            student_id,
+            borrowed_at,
+            duration,
+            penalty_id,
+            charged,
+            is_paid,
+        ) in chunk:
+            out_days = Borrow.count_out_days(borrowed_at, now)
+            amount = DelayPenalty.amount_for(out_days, duration)
+            if penalty_id is None:
+                penalty = DelayPenalty(
+                    borrow_id=borrow_id, amount=amount, is_paid=False
+                )
+                new.append(penalty)
+                kind = BorrowEvent.KIND_PENALIZED
+            elif not is_paid and charged != amount:
+                penalty = DelayPenalty(
+                    pk=penalty_id, borrow_id=borrow_id, amount=amount, is_paid=False
+                )
+                stale.append(penalty)
+                kind = BorrowEvent.KIND_PENALTY_CHANGED
+            else:
+                continue
+            events.append((penalty, student_id, kind))
+            students.add(student_id)
+        with transaction.atomic():
+            DelayPenalty.objects.bulk_create(new, ignore_conflicts=True)
+            DelayPenalty.objects.bulk_update(stale, ("amount",))
+            # Stamped after the writes they record, like those of single saves.
+            BorrowEvent.objects.bulk_create(
+                BorrowEvent(**BorrowEvent.for_penalty(*event)) for event in events
+            )
+            StudentStanding.objects.reconcile(students)
+        created += len(new)
+        updated += len(stale)
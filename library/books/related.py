@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+from library.books import cache as catalog_cache
+from library.books.models import Book, RelatedBook
+
+
+def index_size():
+    return settings.RELATED_BOOKS_INDEX_SIZE
+
+
+def compute_scores(book):
+    """Return ``(book_id, score)`` pairs of books sharing the type and tags of ``book``."""
+    return (
+        Book.objects.exclude(pk=book.pk)
+        .filter(type=book.type, tags__in=book.tags.all())
+        .values_list("pk")
+        .annotate(score=Count("pk"))
+        .order_by("-score", "pk")
+    )
+
+
+def _saturated(book_ids):
+    return set(
+        RelatedBook.objects.filter(book__in=book_ids)
+        .values("book")
+        .annotate(entries=Count("pk"))
+        .filter(entries__gte=index_size())
+        .values_list("book", flat=True)
+    )
+
+
+def _trim(book_ids):
+    """Delete the entries of ``book_ids`` ranked past the index size, in one query."""
+    ahead = (
+        RelatedBook.objects.filter(book=OuterRef("book"))
+        .filter(
+            Q(score__gt=OuterRef("score"))
+            | Q(score=OuterRef("score"), related__lt=OuterRef("related"))
+        )
+        .order_by()
+        .values("book")
+        .annotate(entries=Count("pk"))
+        .values("entries")
+    )
+    RelatedBook.objects.filter(book__in=book_ids).annotate(rank=Subquery(ahead)).filter(
+        rank__gte=index_size()
+    ).delete()
+
+
+def _rebuild_entries(book_ids):
+    for book in Book.objects.filter(pk__in=book_ids):
+        RelatedBook.objects.filter(book=book).delete()
+        RelatedBook.objects.bulk_create(
+            RelatedBook(book=book, related_id=related_id, score=score)
+            for related_id, score in compute_scores(book)[: index_size()]
+        )
+
+
+@transaction.atomic
+def update_book(book):
+    """Refresh the index after the tags or the type of ``book`` changed.
+
+    The entries of ``book`` itself are recomputed, ``book`` is offered to
+    every book it now scores with, and books whose saturated list lost
+    ``book`` (or saw its score drop) are rebuilt so they can pick up the next
+    best candidate.
+    """
+    previous = dict(
+        RelatedBook.objects.filter(related=book).values_list("book", "score")
+    )
+    saturated = _saturated(list(previous))
+    RelatedBook.objects.filter(Q(book=book) | Q(related=book)).delete()
+    scores = dict(compute_scores(book))
+    RelatedBook.objects.bulk_create(
+        [
+            RelatedBook(book=book, related_id=related_id, score=score)
+            for related_id, score in list(scores.items())[: index_size()]
+        ]
+        + [
+            RelatedBook(book_id=related_id, related=book, score=score)
+            for related_id, score in scores.items()
+        ]
+    )
+    _trim(scores)
+    _rebuild_entries(
+        [
+            book_id
+            for book_id, score in previous.items()
+            if book_id in saturated and scores.get(book_id, 0) < score
+        ]
+    )
+
+
+def collect_dependents(book):
+    """Books with a saturated list containing ``book``, to be refilled once it is gone."""
+    return _saturated(RelatedBook.objects.filter(related=book).values("book"))
+
+
+@transaction.atomic
+def refill(book_ids):
+    _rebuild_entries(book_ids)
+
+
+def rebuild_index(batch_size=1000):
+    """Recompute the whole index with a single pass over the tags through table."""
+    through = Book.tags.through
+    pairs = (
+        through.objects.filter(
+            Q(tag__book__lt=F("book")) | Q(tag__book__gt=F("book")),
+            tag__book__type=F("book__type"),
+        )
+        .values_list("book", "tag__book")
+        .annotate(score=Count("tag"))
+        .order_by("book", "-score", "tag__book")
+    )
+    limit = index_size()
+    with transaction.atomic():
+        RelatedBook.objects.all().delete()
+        batch, current, taken, total = [], None, 0, 0
+        for book_id, related_id, score in pairs.iterator():
+            if book_id != current:
+                current, taken = book_id, 0
+            if taken == limit:
+                continue
+            taken += 1
+            batch.append(
+                RelatedBook(book_id=book_id, related_id=related_id, score=score)
+            )
+            if len(batch) >= batch_size:
+                RelatedBook.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        RelatedBook.objects.bulk_create(batch)
+        catalog_cache.invalidate(catalog_cache.BOOKS)
+        return total + len(batch)
@@ -0,0 +1,111 @@
+import random
+
+from asgiref.local import Local
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+_state = Local()
+
+
+def get_cache():
+    return caches[settings.DATABASE_REPLICA_PIN_CACHE]
+
+
+def _pin_key(user_id):
+    return f"replicas:pin:{user_id}"
+
+
+def pin(user_id):
+    """Read everything from the primary for a while, so that the user sees their writes."""
+    get_cache().set(_pin_key(user_id), True, settings.DATABASE_REPLICA_PIN_TIMEOUT)
+
+
+async def apin(user_id):
+    await get_cache().aset(
+        _pin_key(user_id), True, settings.DATABASE_REPLICA_PIN_TIMEOUT
+    )
+
+
+def is_pinned(user_id):
+    return get_cache().get(_pin_key(user_id), False)
+
+
+def read_from_replica(user_id):
+    """Send the reads of the current request to a random replica, unless ``user_id`` is pinned."""
+    if settings.DATABASE_REPLICAS and not is_pinned(user_id):
+        _state.alias = random.choice(settings.DATABASE_REPLICAS)
+
+
+def read_from_primary():
+    _state.alias = None
+
+
+def replica_alias():
+    """Return the replica the current request reads from, if any."""
+    return getattr(_state, "alias", None)
+
+
+class ReplicaRouter:
+    """Route reads to the replica picked for the current request, if any.
+
+    Requests only read from a replica once ``read_from_replica`` is called,
+    i.e. after authentication by the catalog views, and writes always go to
+    the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+
+def is_write(request, response):
+    user = getattr(request, "user", None)
+    return (
+        request.method not in ("GET", "HEAD", "OPTIONS")
+        and response.status_code < 400
+        and user is not None
+        and user.is_authenticated
+    )
+
+
+class ReplicaPinMiddleware:
+    """Pin users to the primary after every successful write request.
+
+    Unused unless ``DATABASE_REPLICAS`` is set. Runs natively under ASGI too,
+    so that writes served there pin their user as well.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if is_write(request, response):
+            pin(request.user.pk)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if is_write(request, response):
+            await apin(request.user.pk)
+        return response
@@ -7,3 +7,5 @@ router.register(r"tags", views.TagViewSet)
 router.register(r"books", views.BookViewSet)
 router.register(r"borrows", views.BorrowViewSet)
 router.register(r"delay-penalties", views.DelayPenaltyViewSet)
+router.register(r"circulation-stats", views.CirculationStatViewSet)
+router.register(r"tokens", views.TokenViewSet, basename="token")
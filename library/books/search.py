@@ -0,0 +1,147 @@
+import math
+import re
+from abc import ABC, abstractmethod
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from library.books.models import Book, BookSearchToken
+
+WORD_PATTERN = re.compile(r"\w+")
+ISBN_PATTERN = re.compile(r"^[0-9Xx]+$")
+
+
+def trigrams(text):
+    """Split ``text`` into the padded word trigrams also used by PostgreSQL's pg_trgm."""
+    grams = set()
+    for word in WORD_PATTERN.findall(text.casefold()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def normalize_isbn(query):
+    isbn = re.sub(r"[\s-]", "", query)
+    return isbn.upper() if ISBN_PATTERN.match(isbn) else None
+
+
+def isbn_prefix_filter(prefix):
+    """Prefix match written as a range, so that it is served by the unique ISBN index."""
+    successor = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(isbn__gte=prefix, isbn__lt=successor)
+
+
+class SearchBackend(ABC):
+    """Book search, and the upkeep of whatever index it needs; unindexed by default."""
+
+    def index(self, books):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        return 0
+
+    @abstractmethod
+    def search(self, queryset, query):
+        """Filter ``queryset`` down to the books matching ``query``, best first if ranked."""
+
+
+class LikeSearchBackend(SearchBackend):
+    """Unindexed ``icontains`` matching, as done by DRF's ``SearchFilter``."""
+
+    fields = ("title", "isbn", "authors")
+
+    def search(self, queryset, query):
+        conditions = Q()
+        for term in query.split():
+            term_condition = Q()
+            for field in self.fields:
+                term_condition |= Q(**{f"{field}__icontains": term})
+            conditions &= term_condition
+        return queryset.filter(conditions)
+
+
+class TrigramSearchBackend(SearchBackend):
+    """Ranked search over an inverted trigram index kept in ``BookSearchToken``."""
+
+    weights = {"title": 3, "authors": 1}
+
+    def tokens(self, book):
+        weights = Counter()
+        for field, weight in self.weights.items():
+            for gram in trigrams(getattr(book, field)):
+                weights[gram] += weight
+        return [
+            BookSearchToken(book=book, token=gram, weight=weight)
+            for gram, weight in weights.items()
+        ]
+
+    @transaction.atomic
+    def index(self, books):
+        books = list(books)
+        BookSearchToken.objects.filter(book__in=[book.pk for book in books]).delete()
+        BookSearchToken.objects.bulk_create(
+            token for book in books for token in self.tokens(book)
+        )
+
+    def rebuild(self, batch_size=1000):
+        with transaction.atomic():
+            BookSearchToken.objects.all().delete()
+            total, batch = 0, []
+            for book in Book.objects.only(*self.weights).iterator(
+                chunk_size=batch_size
+            ):
+                batch.extend(self.tokens(book))
+                if len(batch) >= batch_size:
+                    BookSearchToken.objects.bulk_create(batch, batch_size=batch_size)
+                    total += len(batch)
+                    batch = []
+            BookSearchToken.objects.bulk_create(batch, batch_size=batch_size)
+            return total + len(batch)
+
+    def search(self, queryset, query):
+        grams = trigrams(query)
+        isbn = normalize_isbn(query)
+        if not grams and not isbn:
+            return queryset.none()
+        needed = math.ceil(len(grams) * settings.BOOK_SEARCH_MIN_SIMILARITY)
+        matches = (
+            BookSearchToken.objects.filter(token__in=grams)
+            .values("book")
+            .annotate(hits=Count("pk"), rank=Sum("weight"))
+            .filter(hits__gte=max(needed, 1))
+        )
+        condition = Q(pk__in=matches.values("book"))
+        isbn_rank = Value(0, output_field=IntegerField())
+        if isbn:
+            condition |= isbn_prefix_filter(isbn)
+            isbn_rank = Case(
+                When(isbn_prefix_filter(isbn), then=Value(1000)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        text_rank = Subquery(matches.filter(book=OuterRef("pk")).values("rank"))
+        return (
+            queryset.filter(condition)
+            .annotate(
+                rank=isbn_rank + Coalesce(text_rank, 0, output_field=IntegerField())
+            )
+            .order_by("-rank", "pk")
+        )
+
+
+def get_search_backend():
+    return import_string(settings.BOOK_SEARCH_BACKEND)()
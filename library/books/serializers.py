@@ -1,8 +1,21 @@
+from collections import defaultdict
+from operator import itemgetter
+
+from django.conf import settings
 from django.utils.translation import gettext as _
-from rest_framework import serializers
+from rest_framework import ISO_8601, serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.relations import RelatedField
+from rest_framework.settings import api_settings
 
-from library.books.models import Tag, Book, Borrow, DelayPenalty
+from library.books.models import (
+    Tag,
+    Book,
+    Borrow,
+    BorrowEvent,
+    CirculationStat,
+    DelayPenalty,
+)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -16,6 +29,7 @@ class BookSerializer(serializers.ModelSerializer):
         many=True, slug_field="name", queryset=Tag.objects.all()
     )
     type_verbose = serializers.CharField(read_only=True)
+    is_available = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Book
@@ -35,8 +49,6 @@ class BorrowSerializer(serializers.ModelSerializer):
 
     def save(self, **kwargs):
         try:
-            if not self.instance:
-                Borrow(**self.validated_data, **kwargs).clean()
             return super(BorrowSerializer, self).save(**kwargs)
         except Exception as e:
             raise ValidationError(e)
@@ -46,3 +58,150 @@ class DelayPenaltySerializer(serializers.ModelSerializer):
     class Meta:
         model = DelayPenalty
         fields = "__all__"
+
+
+class BorrowEventSerializer(serializers.ModelSerializer):
+    borrow = serializers.IntegerField(source="borrow_id")
+    student = serializers.IntegerField(source="student_id")
+
+    class Meta:
+        model = BorrowEvent
+        fields = ("id", "position", "kind", "borrow", "student", "data", "created_at")
+
+
+class CirculationStatSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CirculationStat
+        fields = ("month", "dimension", "key", "borrows", "penalty_revenue")
+
+
+class TopBooksSerializer(serializers.Serializer):
+    """Query parameters of the top borrowed books."""
+
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class BorrowFeedSerializer(serializers.Serializer):
+    """Query parameters of the borrow feed."""
+
+    after = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+    wait = serializers.FloatField(min_value=0, default=0)
+
+    def validate_wait(self, value):
+        return min(value, settings.BORROW_FEED_MAX_WAIT)
+
+
+class BorrowHistorySerializer(serializers.Serializer):
+    """Query parameters of the borrow history."""
+
+    student = serializers.IntegerField(min_value=1, required=False)
+
+
+class BookAvailabilitySerializer(serializers.Serializer):
+    """Query parameters of the book availability endpoint."""
+
+    MAX_IDS = 1000
+
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        try:
+            ids = {int(pk) for pk in value.split(",") if pk.strip()}
+        except ValueError:
+            raise ValidationError(_("Give book ids separated by commas."))
+        if len(ids) > self.MAX_IDS:
+            raise ValidationError(
+                _("Ask for at most %(count)d books at once.") % {"count": self.MAX_IDS}
+            )
+        return sorted(ids)
+
+
+class ValuesSerializer:
+    """Render ``values()`` rows exactly like ``serializer_class`` renders instances.
+
+    Meant for read-only lists: each column is converted by the matching field
+    of the serializer, without building a model instance or a serializer per
+    row. Fields which are not model columns are given by ``get_computed``.
+    """
+
+    serializer_class = None
+
+    def __init__(self, context=None):
+        serializer = self.serializer_class(context=context)
+        self.fields = [
+            field for field in serializer.fields.values() if not field.write_only
+        ]
+        model = serializer.Meta.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        self.columns = [
+            field.source for field in self.fields if field.source in concrete
+        ]
+
+    def get_computed(self, rows):
+        return {}
+
+    @staticmethod
+    def get_converter(field):
+        """Return the representation function of ``field``, for non-null values."""
+        output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+        if (
+            not isinstance(field, serializers.DateTimeField)
+            or not settings.USE_TZ
+            or output_format is None
+            or output_format.lower() != ISO_8601
+        ):
+            return field.to_representation
+        # Same output as DateTimeField.to_representation, but the current time
+        # zone is looked up once per page rather than once per value.
+        field_timezone = (
+            field.timezone if hasattr(field, "timezone") else field.default_timezone()
+        )
+        if field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            value = value.astimezone(field_timezone).isoformat()
+            return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+        return convert
+
+    @staticmethod
+    def read_column(key, convert=None):
+        if convert is None:
+            return itemgetter(key)
+        return lambda row: None if row[key] is None else convert(row[key])
+
+    def to_representation(self, rows):
+        computed = self.get_computed(rows)
+        converters = []
+        for field in self.fields:
+            if field.field_name in computed:
+                converter = computed[field.field_name]
+            elif isinstance(field, RelatedField):
+                converter = self.read_column(field.source)
+            else:
+                converter = self.read_column(field.source, self.get_converter(field))
+            converters.append((field.field_name, converter))
+        return [{name: convert(row) for name, convert in converters} for row in rows]
+
+
+class BookValuesSerializer(ValuesSerializer):
+    serializer_class = BookSerializer
+
+    def get_computed(self, rows):
+        tags = defaultdict(list)
+        for book_id, name in Tag.objects.filter(
+            book__in=[row["id"] for row in rows]
+        ).values_list("book", "name"):
+            tags[book_id].append(name)
+        types = {key: str(label) for key, label in Book.TYPE_CHOICES}
+        return {
+            "tags": lambda row: tags[row["id"]],
+            "type_verbose": lambda row: types.get(row["type"]),
+            "is_available": lambda row: row["out_copies"] < row["copies"],
+        }
+
+
+class BorrowValuesSerializer(ValuesSerializer):
+    serializer_class = BorrowSerializer
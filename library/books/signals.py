@@ -0,0 +1,303 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.contrib.auth.models import Group, User
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from library.books import authentication
+from library.books import cache as catalog_cache
+from library.books import facets
+from library.books import related
+from library.books.search import get_search_backend
+from library.books.models import (
+    ArchivedBorrow,
+    Book,
+    Borrow,
+    BorrowEvent,
+    CirculationDelta,
+    CirculationStat,
+    DelayPenalty,
+    StudentStanding,
+    Tag,
+)
+
+
+@receiver(pre_save, sender=Tag)
+@receiver(pre_save, sender=Book)
+@receiver(pre_save, sender=Borrow)
+def track_modification(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.updated_at = timezone.now()
+
+
+@receiver(pre_save, sender=Book)
+def detect_book_type_change(sender, instance, raw=False, **kwargs):
+    instance._old_type = None
+    if not raw and not instance._state.adding:
+        instance._old_type = (
+            Book.objects.filter(pk=instance.pk).values_list("type", flat=True).first()
+        )
+    instance._type_changed = instance._old_type not in (None, instance.type)
+
+
+@receiver(post_save, sender=Book)
+def reindex_book_on_type_change(sender, instance, **kwargs):
+    if getattr(instance, "_type_changed", False):
+        related.update_book(instance)
+
+
+@receiver(post_save, sender=Book)
+def update_search_index(sender, instance, **kwargs):
+    get_search_backend().index([instance])
+
+
+@receiver(m2m_changed, sender=Book.tags.through)
+def reindex_books_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        instance._cleared_books = list(instance.book_set.values_list("pk", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        related.update_book(instance)
+        return
+    if action == "post_clear":
+        pk_set = getattr(instance, "_cleared_books", ())
+    for book in Book.objects.filter(pk__in=pk_set):
+        related.update_book(book)
+
+
+@receiver(m2m_changed, sender=Book.tags.through)
+def touch_books_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        Book.objects.filter(pk=instance.pk).touch()
+        return
+    if action == "post_clear":
+        pk_set = getattr(instance, "_cleared_books", ())
+    Book.objects.filter(pk__in=pk_set).touch()
+
+
+@receiver(m2m_changed, sender=Book.tags.through)
+def count_tagged_books(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and not reverse:
+        instance._cleared_tags = list(instance.tags.values_list("pk", flat=True))
+    if action == "pre_remove":
+        # post_remove is sent every pk asked for, linked or not.
+        linked = instance.book_set if reverse else instance.tags
+        instance._removed_pks = list(
+            linked.filter(pk__in=pk_set).values_list("pk", flat=True)
+        )
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if action == "post_clear":
+        pk_set = getattr(instance, "_cleared_books" if reverse else "_cleared_tags", ())
+    if action == "post_remove":
+        pk_set = getattr(instance, "_removed_pks", ())
+    delta = 1 if action == "post_add" else -1
+    if reverse:
+        facets.count_tags({instance.pk: delta * len(pk_set)})
+    else:
+        facets.count_tags(dict.fromkeys(pk_set, delta))
+
+
+@receiver(post_save, sender=Book)
+def count_book_type(sender, instance, created, **kwargs):
+    if created:
+        facets.count_types({instance.type: 1})
+    elif getattr(instance, "_type_changed", False):
+        facets.count_types({instance._old_type: -1, instance.type: 1})
+
+
+@receiver(post_save, sender=Tag)
+def count_new_tag(sender, instance, created, **kwargs):
+    if created:
+        facets.count_new_tag(instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+def touch_books_on_tag_rename(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        Book.objects.filter(tags=instance).touch()
+
+
+@receiver(pre_delete, sender=Book)
+def collect_related_dependents(sender, instance, **kwargs):
+    instance._related_dependents = related.collect_dependents(instance)
+
+
+@receiver(pre_delete, sender=Book)
+def collect_book_tags(sender, instance, **kwargs):
+    instance._tag_ids = list(instance.tags.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def uncount_deleted_book(sender, instance, **kwargs):
+    facets.count_tags(dict.fromkeys(getattr(instance, "_tag_ids", ()), -1))
+    facets.count_types({instance.type: -1})
+
+
+@receiver(post_delete, sender=Book)
+def refill_related_dependents(sender, instance, **kwargs):
+    related.refill(getattr(instance, "_related_dependents", ()))
+
+
+@receiver(pre_delete, sender=Tag)
+def collect_tagged_books(sender, instance, **kwargs):
+    instance._tagged_books = list(instance.book_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def reindex_tagged_books(sender, instance, **kwargs):
+    books = Book.objects.filter(pk__in=getattr(instance, "_tagged_books", ()))
+    books.touch()
+    for book in books:
+        related.update_book(book)
+
+
+@receiver(post_delete, sender=Borrow)
+def release_borrowed_copy(sender, instance, **kwargs):
+    if instance.returned_at is None:
+        Book.objects.filter(pk=instance.book_id).release_copy()
+        catalog_cache.invalidate(catalog_cache.AVAILABILITY)
+        StudentStanding.objects.filter(pk=instance.student_id).release_borrow()
+
+
+@receiver(post_delete, sender=DelayPenalty)
+def uncount_unpaid_penalty(sender, instance, **kwargs):
+    if instance.is_paid:
+        return
+    # Penalties are deleted before the borrow they are deleted along with.
+    student_id = (
+        Borrow.objects.filter(pk=instance.borrow_id)
+        .values_list("student", flat=True)
+        .first()
+    )
+    if student_id is not None:
+        StudentStanding.objects.add_unpaid(
+            student_id, penalties=-1, amount=-instance.amount
+        )
+
+
+@receiver(post_delete, sender=Borrow)
+def record_deleted_borrow(sender, instance, **kwargs):
+    BorrowEvent.objects.create(
+        **BorrowEvent.for_borrow(instance, BorrowEvent.KIND_DELETED)
+    )
+
+
+@receiver(post_delete, sender=DelayPenalty)
+def record_deleted_penalty(sender, instance, **kwargs):
+    student_id = (
+        Borrow.objects.filter(pk=instance.borrow_id)
+        .values_list("student", flat=True)
+        .first()
+    )
+    if student_id is not None:
+        BorrowEvent.objects.create(
+            **BorrowEvent.for_penalty(
+                instance, student_id, BorrowEvent.KIND_PENALTY_DELETED
+            )
+        )
+
+
+@receiver(post_delete, sender=Borrow)
+def uncount_deleted_borrow(sender, instance, **kwargs):
+    CirculationDelta.record(
+        CirculationStat.month_of(instance.borrowed_at), instance.book_id, borrows=-1
+    )
+
+
+@receiver(post_delete, sender=DelayPenalty)
+def uncount_deleted_penalty(sender, instance, **kwargs):
+    if not instance.revenue:
+        return
+    # Penalties are deleted before the borrow they are deleted along with.
+    borrow = (
+        Borrow.objects.filter(pk=instance.borrow_id)
+        .values_list("borrowed_at", "book")
+        .first()
+    )
+    if borrow:
+        borrowed_at, book_id = borrow
+        CirculationDelta.record(
+            CirculationStat.month_of(borrowed_at),
+            book_id,
+            penalty_revenue=-instance.revenue,
+        )
+
+
+@receiver(pre_delete, sender=Book)
+def uncount_archived_borrows(sender, instance, **kwargs):
+    # Archived borrows go along with their book without any signal.
+    CirculationDelta.objects.bulk_create(
+        CirculationDelta(
+            month=CirculationStat.month_of(borrowed_at),
+            book_id=instance.pk,
+            borrows=-1,
+            penalty_revenue=-(amount or 0) if is_paid else 0,
+        )
+        for borrowed_at, amount, is_paid in ArchivedBorrow.objects.filter(
+            book=instance, borrowed_at__isnull=False
+        ).values_list("borrowed_at", "penalty__amount", "penalty__is_paid")
+    )
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(m2m_changed, sender=Book.tags.through)
+def invalidate_cached_books(sender, **kwargs):
+    catalog_cache.invalidate(catalog_cache.BOOKS)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_cached_tags(sender, **kwargs):
+    catalog_cache.invalidate(catalog_cache.TAGS)
+
+
+@receiver(post_delete, sender=Token)
+def forget_revoked_token(sender, instance, **kwargs):
+    authentication.forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def forget_changed_user(sender, instance, **kwargs):
+    authentication.forget_tokens(
+        Token.objects.filter(user=instance).values_list("key", flat=True)
+    )
+    authentication.forget_permissions([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def forget_changed_permissions(
+    sender, instance, action, reverse, model, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if isinstance(instance, User):
+        user_ids = [instance.pk]
+    elif model is User:
+        user_ids = pk_set or instance.user_set.values_list("pk", flat=True)
+    elif isinstance(instance, Group):
+        user_ids = instance.user_set.values_list("pk", flat=True)
+    elif action == "pre_clear":
+        user_ids = User.objects.filter(groups__permissions=instance).values_list(
+            "pk", flat=True
+        )
+    else:
+        user_ids = User.objects.filter(groups__in=pk_set).values_list("pk", flat=True)
+    authentication.forget_permissions(set(user_ids))
+
+
+@receiver(pre_delete, sender=Group)
+def forget_deleted_group_permissions(sender, instance, **kwargs):
+    authentication.forget_permissions(instance.user_set.values_list("pk", flat=True))
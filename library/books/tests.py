@@ -1,13 +1,64 @@
+import csv
+import itertools
+import json
+import re
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.management import call_command
 from django.utils import timezone
 
 from django.contrib.auth.models import User, Group, Permission
-from django.test import TestCase
+from django.core.exceptions import ValidationError
+from django.core.cache import caches
+from django.db import connection, connections
+from django.db.models import Count, F
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from library.books.models import Tag, Book, Borrow, DelayPenalty
+from library.books import authentication, checks, circulation, facets, metrics, related
+from library.books.management.commands.explain_queries import (
+    explain,
+    sequential_scans,
+)
+from library.books.models import (
+    ArchivedBorrow,
+    ArchivedDelayPenalty,
+    BorrowEvent,
+    CirculationStat,
+    DateRangeQuerySetMixin,
+    Tag,
+    Book,
+    Borrow,
+    DelayPenalty,
+    RelatedBook,
+    StudentStanding,
+)
+from library.books.authentication import CachedTokenAuthentication
+from library.books.mixins import plan_lookups
+from library.books.pagination import EstimatedCountPaginator
+from library.books.penalties import apply_delay_penalties
+from library.books.related import rebuild_index
+from library.books.search import SearchBackend, get_search_backend
+from library.books.serializers import (
+    BookSerializer,
+    BookValuesSerializer,
+    BorrowSerializer,
+    BorrowValuesSerializer,
+    ValuesSerializer,
+)
 
 
 class BookTestCase(TestCase):
+
     def create_groups(self):
         managers = Group.objects.create(name="Manager")
         managers.permissions.set(
@@ -25,6 +76,7 @@ class BookTestCase(TestCase):
                     "view_book",
                     "change_delaypenalty",
                     "view_delaypenalty",
+                    "view_circulationstat",
                 ]
             )
         )
@@ -115,6 +167,8 @@ class BookTestCase(TestCase):
             book.tags.set(tags[book.id - 1])
 
     def setUp(self):
+        for cache in caches.all():
+            cache.clear()
         self.create_groups()
         self.create_users()
         self.create_books()
@@ -137,6 +191,527 @@ class BookTestCase(TestCase):
         self.assertEqual(json["results"][0]["id"], 5)
         self.assertEqual(json["results"][1]["id"], 2)
 
+    def test_book_related_follows_tag_changes(self):
+        """Related books index is updated when tags or type change"""
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        Book.objects.get(pk=2).tags.add(self.tags[1])
+        response = client.get("/books/4/related/")
+        self.assertEqual([book["id"] for book in response.json()["results"]], [2, 5])
+        book = Book.objects.get(pk=5)
+        book.type = "T"
+        book.save()
+        response = client.get("/books/4/related/")
+        self.assertEqual([book["id"] for book in response.json()["results"]], [2])
+        Book.objects.get(pk=2).delete()
+        response = client.get("/books/4/related/")
+        self.assertEqual(response.json()["count"], 0)
+
+    def test_related_books_index_rebuild(self):
+        """Rebuilding the index reproduces the incrementally maintained one"""
+        entries = set(RelatedBook.objects.values_list("book", "related", "score"))
+        self.assertEqual(rebuild_index(), len(entries))
+        self.assertEqual(
+            set(RelatedBook.objects.values_list("book", "related", "score")), entries
+        )
+
+    @override_settings(RELATED_BOOKS_INDEX_SIZE=1)
+    def test_related_books_index_refill(self):
+        """A full related list picks up the next candidate when an entry drops"""
+        rebuild_index()
+        self.assertEqual(
+            [book.id for book in Book.objects.get(pk=4).related_books], [5]
+        )
+        Book.objects.get(pk=5).tags.remove(self.tags[1])
+        self.assertEqual(
+            [book.id for book in Book.objects.get(pk=4).related_books], [2]
+        )
+
+    def test_related_books_index_trim(self):
+        """Entries past the index size are trimmed at once, keeping the best ranked"""
+
+        def entries():
+            return set(RelatedBook.objects.values_list("book", "related", "score"))
+
+        books = list(Book.objects.values_list("pk", flat=True))
+        rebuild_index()
+        with override_settings(RELATED_BOOKS_INDEX_SIZE=1):
+            with self.assertNumQueries(1):
+                related._trim(books)
+            trimmed = entries()
+            rebuild_index()
+            self.assertEqual(trimmed, entries())
+            Book.objects.get(pk=1).tags.add(*self.tags)
+            updated = entries()
+            rebuild_index()
+            self.assertEqual(updated, entries())
+
+    def test_book_search(self):
+        """Books are found through the search index, ranked and by ISBN prefix"""
+        get_search_backend().rebuild()
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        response = client.get("/books/", data={"search": "a3"})
+        self.assertEqual([book["id"] for book in response.json()["results"]], [2, 3])
+        response = client.get("/books/", data={"search": "0000000000004"})
+        self.assertEqual([book["id"] for book in response.json()["results"]], [4])
+        response = client.get("/books/", data={"search": "000-000"})
+        self.assertEqual(response.json()["count"], 5)
+        book = Book.objects.get(pk=1)
+        book.title = "Data Structures"
+        book.save()
+        response = client.get("/books/", data={"search": "structure"})
+        self.assertEqual([book["id"] for book in response.json()["results"]], [1])
+        response = client.get("/books/", data={"search": "b1"})
+        self.assertEqual(response.json()["count"], 0)
+
+    @override_settings(BOOK_SEARCH_BACKEND="library.books.search.LikeSearchBackend")
+    def test_book_search_like_backend(self):
+        """Search backend is pluggable"""
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        response = client.get("/books/", data={"search": "a3", "type__in": "T"})
+        self.assertEqual([book["id"] for book in response.json()["results"]], [3])
+        with self.assertRaises(TypeError):
+            type("Unsearchable", (SearchBackend,), {})()
+
+    def assertQueryBudget(self, budget, user, url):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=user.pk))
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(context),
+            budget,
+            "\n".join(query["sql"] for query in context.captured_queries),
+        )
+
+    def test_query_budgets(self):
+        """Listing endpoints run a bounded number of queries"""
+        Book.objects.bulk_create(
+            Book(title=f"B{i}", isbn=f"{i:013}", authors="A", type="R", copies=1)
+            for i in range(6, 40)
+        )
+        for book in Book.objects.filter(pk__gt=5):
+            book.tags.set(self.tags)
+        ten_days_ago = timezone.now() - timezone.timedelta(days=10)
+        for student in self.students:
+            borrow = Borrow.objects.create(
+                book_id=student.pk,
+                student=student,
+                borrowed_at=ten_days_ago,
+                duration=5,
+            )
+            borrow.returned_at = timezone.now()
+            borrow.save()
+        # Lists of books, tags and borrows include one query for their validators.
+        self.assertQueryBudget(4, self.students[0], "/books/")
+        self.assertQueryBudget(5, self.students[0], "/books/4/related/")
+        self.assertQueryBudget(3, self.students[0], "/tags/")
+        self.assertQueryBudget(5, self.manager, "/borrows/")
+        self.assertQueryBudget(4, self.manager, "/delay-penalties/")
+        self.assertQueryBudget(4, self.students[0], "/delay-penalties/")
+
+    def test_query_plan_follows_serializer_fields(self):
+        """Rendered relations are joined or prefetched"""
+
+        class PenaltySerializer(serializers.ModelSerializer):
+            title = serializers.CharField(source="borrow.book.title")
+            book = BookSerializer(source="borrow.book")
+
+            class Meta:
+                model = DelayPenalty
+                fields = ("id", "borrow", "title", "book")
+
+        self.assertEqual(
+            plan_lookups(PenaltySerializer(), DelayPenalty),
+            ({"borrow__book"}, {"borrow__book__tags"}),
+        )
+        self.assertEqual(plan_lookups(BookSerializer(), Book), (set(), {"tags"}))
+
+    def test_import_books(self):
+        """Books are imported in batches, skipping duplicates and invalid rows"""
+        rows = [
+            {
+                "title": "B6",
+                "isbn": "0000000000006",
+                "authors": "A6",
+                "type": "R",
+                "copies": 2,
+                "tags": ["General", "New"],
+            },
+            {"title": "B7", "isbn": "7", "authors": "A7", "type": "R", "copies": 1},
+            {
+                "title": "B1",
+                "isbn": "0000000000001",
+                "authors": "A1",
+                "type": "A",
+                "copies": 1,
+            },
+            {
+                "title": "B8",
+                "isbn": "0000000000008",
+                "authors": "A8",
+                "type": "R",
+                "copies": 1,
+                "tags": "New",
+            },
+            {
+                "title": "B6",
+                "isbn": "0000000000006",
+                "authors": "A6",
+                "type": "R",
+                "copies": 2,
+            },
+        ]
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        client.get("/tags/?limit=100")
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as file:
+            file.writelines(json.dumps(row) + "\n" for row in rows)
+            file.write('{"title": "B9",\n["B10"]\n')
+            file.flush()
+            stdout, stderr = StringIO(), StringIO()
+            call_command(
+                "import_books", file.name, batch_size=2, stdout=stdout, stderr=stderr
+            )
+        self.assertIn("Imported 2 book(s), skipped 2 duplicate(s)", stdout.getvalue())
+        response = client.get("/tags/?limit=100")
+        self.assertIn("New", [tag["name"] for tag in response.json()["results"]])
+        self.assertIn("Row 2: isbn", stderr.getvalue())
+        self.assertIn("Row 6: json: Malformed JSON", stderr.getvalue())
+        self.assertIn("Row 7: json: Not a JSON object.", stderr.getvalue())
+        self.assertIn("rejected 3 row(s)", stdout.getvalue())
+        book = Book.objects.get(isbn="0000000000006")
+        self.assertEqual(
+            set(book.tags.values_list("name", flat=True)), {"General", "New"}
+        )
+        self.assertEqual([related.id for related in book.related_books], [4, 5, 7])
+
+    def test_generate_library(self):
+        """The generated library is reproducible and consistent with the borrow rules"""
+        options = {"books": 300, "tags": 40, "students": 60, "borrows": 600}
+        call_command("generate_library", seed=7, stdout=StringIO(), **options)
+        self.assertEqual(Book.objects.count(), 305)
+        self.assertEqual(User.objects.filter(groups__name="Student").count(), 62)
+        self.assertGreater(Borrow.objects.count(), 300)
+        self.assertEqual(apply_delay_penalties(), (0, 0))
+        self.assertFalse(
+            Borrow.objects.filter(borrowed_at__lt=F("requested_at")).exists()
+        )
+        self.assertLess(
+            Borrow.objects.earliest("requested_at").requested_at,
+            timezone.now() - timezone.timedelta(days=365),
+        )
+        self.assertTrue(Borrow._meta.get_field("requested_at").auto_now_add)
+        self.assertEqual(Book.objects.reconcile_out_copies(), 0)
+        self.assertFalse(Book.objects.filter(out_copies__gt=F("copies")).exists())
+        self.assertFalse(
+            Borrow.objects.open()
+            .values("student")
+            .annotate(count=Count("pk"))
+            .filter(count__gt=1)
+            .exists()
+        )
+        titles = list(Book.objects.order_by("pk").values_list("title", flat=True))
+        Book.objects.filter(isbn__startswith="979").delete()
+        call_command("generate_library", seed=7, stdout=StringIO(), **options)
+        self.assertEqual(
+            list(Book.objects.order_by("pk").values_list("title", flat=True)), titles
+        )
+
+    def test_values_serializers_match_model_serializers(self):
+        """The values() fast path renders byte-identical JSON, without instances"""
+        options = {"books": 300, "tags": 40, "students": 60, "borrows": 600}
+        call_command("generate_library", seed=3, stdout=StringIO(), **options)
+        renderer = JSONRenderer()
+        for serializer_class, values_serializer_class, queryset in (
+            (
+                BookSerializer,
+                BookValuesSerializer,
+                Book.objects.prefetch_related("tags").order_by("pk"),
+            ),
+            (BorrowSerializer, BorrowValuesSerializer, Borrow.objects.order_by("pk")),
+        ):
+
+            def serialize():
+                return renderer.render(serializer_class(queryset, many=True).data)
+
+            def serialize_values():
+                serializer = values_serializer_class()
+                rows = list(queryset.values(*serializer.columns))
+                return renderer.render(serializer.to_representation(rows))
+
+            self.assertEqual(serialize_values(), serialize())
+
+        client = APIClient()
+        client.login(username=self.manager.username, password="salam*123")
+        books = Book.objects.filter(type__in="AT").order_by("pk")[10:60]
+        expected = BookSerializer(books, many=True).data
+        for url, model, serializer_class in (
+            ("/books/?type__in=A,T&limit=50&offset=10", Book, BookSerializer),
+            ("/borrows/?limit=50", Borrow, BorrowSerializer),
+        ):
+            # Neither instances nor model serializers are made for list pages.
+            with patch.object(
+                model, "from_db", side_effect=AssertionError
+            ), patch.object(
+                serializer_class, "to_representation", side_effect=AssertionError
+            ):
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["results"]), 50)
+        response = client.get("/books/?type__in=A,T&limit=50&offset=10")
+        self.assertEqual(response.json()["results"], expected)
+
+    def test_catalog_cache(self):
+        """Catalog responses are cached until a book, tag or borrow changes them"""
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        self.assertEqual(client.get("/books/4/")["X-Cache"], "MISS")
+        self.assertEqual(client.get("/books/4/")["X-Cache"], "HIT")
+        self.assertEqual(client.get("/tags/")["X-Cache"], "MISS")
+        self.assertEqual(client.get("/tags/")["X-Cache"], "HIT")
+        # Cached per language and format, e.g. for translated types.
+        english = client.get("/books/4/", HTTP_ACCEPT_LANGUAGE="en")
+        self.assertEqual(
+            (english["Content-Language"], english["X-Cache"]), ("en", "MISS")
+        )
+        english = client.get("/books/4/", HTTP_ACCEPT_LANGUAGE="en")
+        self.assertEqual(english["X-Cache"], "HIT")
+        browsable = client.get("/books/4/", HTTP_ACCEPT="text/html")
+        self.assertEqual(browsable["X-Cache"], "MISS")
+        self.assertEqual(client.get("/books/?available=true")["X-Cache"], "MISS")
+        client.post("/borrows/", data={"book": 4})
+        self.assertEqual(client.get("/tags/")["X-Cache"], "HIT")
+        response = client.get("/books/4/")
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.json()["out_copies"], 1)
+        self.assertEqual(response.json(), BookSerializer(Book.objects.get(pk=4)).data)
+        self.assertEqual(client.get("/books/?available=true")["X-Cache"], "MISS")
+        Book.objects.filter(pk=4).update(copies=1)
+        self.assertFalse(client.get("/books/4/").json()["is_available"])
+        tag = self.tags[0]
+        tag.name = "Science"
+        tag.save()
+        response = client.get("/books/4/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIn("Science", response.json()["tags"])
+        self.assertEqual(client.get("/tags/")["X-Cache"], "MISS")
+        Book.objects.get(pk=4).tags.clear()
+        response = client.get("/books/4/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["tags"], [])
+
+    def test_catalog_cache_check(self):
+        """A catalog cache kept per process shall be reported for deployment"""
+        errors = checks.check_catalog_cache(None)
+        self.assertEqual([error.id for error in errors], ["books.W002"])
+        dummy = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+        with override_settings(CACHES={**settings.CACHES, "catalog": dummy}):
+            self.assertEqual(checks.check_catalog_cache(None), [])
+
+    def test_conditional_get(self):
+        """Unchanged lists and details are answered with 304 without serializing"""
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        client.post("/borrows/", data={"book": 1})
+        urls = ("/books/?type__in=R", "/books/4/", "/tags/", "/borrows/")
+        for url, cached in itertools.product(urls, (True, False)):
+            response = client.get(url)
+            if url.startswith("/books/"):
+                # Taking a copy leaves the response cached, but not current.
+                book = response.json().get("id") or response.json()["results"][0]["id"]
+                borrow = Borrow.objects.create(book_id=book, student=self.students[1])
+                stale = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(stale.status_code, 200)
+                borrow.delete()
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Last-Modified", response)
+            if not cached:
+                caches[settings.CATALOG_CACHE].clear()
+            with patch.object(
+                serializers.Serializer, "to_representation", side_effect=AssertionError
+            ), patch.object(
+                ValuesSerializer, "to_representation", side_effect=AssertionError
+            ):
+                response = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304)
+            vary = {header.strip() for header in response["Vary"].split(",")}
+            self.assertLessEqual({"Authorization", "Cookie", "Accept-Language"}, vary)
+        etag = client.get("/borrows/?count=false")["ETag"]
+        with CaptureQueriesContext(connection) as context:
+            response = client.get("/borrows/?count=false", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn(
+            "COUNT(", "\n".join(query["sql"] for query in context.captured_queries)
+        )
+        etag = client.get("/books/4/")["ETag"]
+        Book.objects.get(pk=4).tags.remove(self.tags[0])
+        response = client.get("/books/4/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["tags"], ["General"])
+        etag = client.get("/books/1/")["ETag"]
+        Borrow.objects.get(student=self.students[0]).delete()
+        response = client.get("/books/1/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["is_available"])
+        etag = client.get("/borrows/")["ETag"]
+        client.post("/borrows/", data={"book": 2})
+        response = client.get("/borrows/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        modified = client.get("/tags/")["Last-Modified"]
+        response = client.get("/tags/", HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_token_authentication(self):
+        """Tokens are issued, rotated and revoked, and verified from the cache"""
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        response = client.post("/tokens/")
+        self.assertEqual(response.status_code, 201)
+        token = response.json()["token"]
+        self.assertEqual(client.post("/tokens/").json()["token"], token)
+        client.logout()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(client.get("/tags/").status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get("/tags/").status_code, 200)
+            user, auth = CachedTokenAuthentication().authenticate_credentials(token)
+        # request.auth is the token, as with the uncached authentication.
+        self.assertIsInstance(auth, Token)
+        self.assertEqual(auth.key, token)
+        self.assertEqual(user, auth.user)
+        response = client.post("/tokens/rotate/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(client.get("/tags/").status_code, 401)
+        client.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['token']}")
+        self.assertEqual(client.get("/tags/").status_code, 200)
+        self.assertEqual(client.post("/tokens/revoke/").status_code, 204)
+        self.assertEqual(client.get("/tags/").status_code, 401)
+
+    def test_cached_permissions_follow_group_changes(self):
+        """Cached permissions are dropped when the groups of a user change"""
+        client = APIClient()
+        client.login(username=self.manager.username, password="salam*123")
+        token = client.post("/tokens/").json()["token"]
+        client.logout()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(client.patch("/books/4/", data={"copies": 2}).status_code, 200)
+        self.manager.groups.clear()
+        self.assertEqual(client.patch("/books/4/", data={"copies": 3}).status_code, 403)
+        self.manager.groups.add(self.groups[0])
+        self.assertEqual(client.patch("/books/4/", data={"copies": 3}).status_code, 200)
+        self.groups[0].permissions.clear()
+        self.assertEqual(client.patch("/books/4/", data={"copies": 4}).status_code, 403)
+
+    def test_auth_cache_timeouts(self):
+        """Auth entries kept per process shall expire quickly, as revocations stay local"""
+        self.assertEqual(authentication.get_timeout(60), 5)
+        self.assertEqual(
+            [error.id for error in checks.check_auth_cache(None)], ["books.W003"]
+        )
+        dummy = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+        with override_settings(CACHES={**settings.CACHES, "auth": dummy}):
+            self.assertEqual(authentication.get_timeout(60), 60)
+            self.assertEqual(checks.check_auth_cache(None), [])
+
+    def test_async_read_endpoints(self):
+        """Async read endpoints answer like their synchronous counterparts"""
+        get_search_backend().rebuild()
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        for url in (
+            "/books/?limit=2&offset=2",
+            "/books/?limit=2&offset=2&count=false",
+            "/books/?limit=2&offset=4&count=false",
+            "/books/?type__in=R,T&search=a3",
+            "/books/?tags__in=1,2&type__in=T&available=true",
+            "/books/4/",
+            "/books/4/related/",
+            "/tags/",
+        ):
+            response = client.get(f"/async{url}")
+            self.assertEqual(response.status_code, 200)
+            expected = client.get(url).json()
+            if "next" in expected:
+                for link in ("next", "previous"):
+                    if expected[link]:
+                        expected[link] = expected[link].replace(
+                            "testserver/", "testserver/async/"
+                        )
+            self.assertEqual(response.json(), expected)
+        self.assertEqual(client.get("/async/books/99/").status_code, 404)
+        for url in ("/books/?tags__in=a", "/books/?tags__in=1,a"):
+            response = client.get(f"/async{url}")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), client.get(url).json())
+        token = client.post("/tokens/").json()["token"]
+        client.logout()
+        self.assertEqual(client.get("/async/tags/").status_code, 401)
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(client.get("/async/tags/").status_code, 200)
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_request_metrics(self):
+        """Requests are measured per route and exposed in the Prometheus format"""
+        metrics.registry.reset()
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        client.get("/books/")
+        client.get("/books/")
+        client.get("/books/4/related/")
+        text = client.get("/metrics").content.decode()
+        self.assertIn("# TYPE library_http_request_duration_seconds histogram", text)
+        self.assertIn(
+            'library_http_requests_total{method="GET",route="api:book-list",status="200"} 2',
+            text,
+        )
+        self.assertIn(
+            'library_http_request_duration_seconds_count{method="GET",route="api:book-related"} 1',
+            text,
+        )
+        self.assertIn(
+            'library_catalog_cache_requests_total{method="GET",outcome="hit",route="api:book-list"} 1',
+            text,
+        )
+        self.assertIn(
+            'library_db_queries_count{method="GET",route="api:book-related"} 1', text
+        )
+        self.assertIn(
+            'library_http_response_size_bytes_count{method="GET",route="api:book-list"} 2',
+            text,
+        )
+        with override_settings(METRICS_ENABLED=False):
+            self.assertEqual(APIClient().get("/metrics").status_code, 404)
+
+    @override_settings(METRICS_ENABLED=True)
+    async def test_request_metrics_async(self):
+        """Under ASGI, the metrics middleware runs natively and still counts queries"""
+
+        async def get_response(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(metrics.MetricsMiddleware(get_response)))
+        metrics.registry.reset()
+        token = await Token.objects.acreate(user=self.students[0])
+        response = await AsyncClient().get(
+            "/async/books/", headers={"Authorization": f"Token {token.key}"}
+        )
+        self.assertEqual(response.status_code, 200)
+        text = metrics.render()
+        self.assertIn(
+            'library_http_requests_total{method="GET",route="async:books-list",status="200"} 1',
+            text,
+        )
+        queries = re.search(
+            r'library_db_queries_sum\{method="GET",route="async:books-list"\} (\d+)',
+            text,
+        )
+        self.assertGreater(int(queries.group(1)), 0)
+
     def test_book_edit_for_manager(self):
         """Manager is allowed to edit"""
         client = APIClient()
@@ -195,6 +770,69 @@ class BookTestCase(TestCase):
         response = client3.get("/borrows/")
         self.assertEqual(response.json()["count"], 2)
 
+    def test_borrow_cursor_pagination(self):
+        """Borrows can be walked with a cursor, with or without a count"""
+        now = timezone.now()
+        for day in range(3):
+            borrow = Borrow.objects.create(
+                book_id=day + 2, student=self.students[0], returned_at=now
+            )
+            Borrow.objects.filter(pk=borrow.pk).update(
+                requested_at=now - timezone.timedelta(days=day)
+            )
+        client = APIClient()
+        client.login(username=self.manager.username, password="salam*123")
+        url = "/borrows/?cursor=&limit=2&count=false"
+        seen = []
+        while url:
+            json = client.get(url).json()
+            self.assertIsNone(json["count"])
+            seen.extend(borrow["id"] for borrow in json["results"])
+            url = json["next"]
+        self.assertEqual(seen, [1, 2, 3])
+        since = (now - timezone.timedelta(days=1, hours=1)).isoformat()
+        response = client.get(
+            "/borrows/", data={"cursor": "", "requested_at__gte": since}
+        )
+        self.assertEqual(response.json()["count"], 2)
+        self.assertEqual(
+            [borrow["id"] for borrow in response.json()["results"]], [1, 2]
+        )
+        response = client.get("/borrows/", data={"limit": 2, "count": "false"})
+        self.assertIsNone(response.json()["count"])
+        self.assertIsNotNone(response.json()["next"])
+
+    def test_borrow_and_penalty_export(self):
+        """Exports stream every filtered row visible to the user"""
+        ten_days_ago = timezone.now() - timezone.timedelta(days=10)
+        for student in self.students:
+            borrow = Borrow.objects.create(
+                book_id=student.pk,
+                student=student,
+                borrowed_at=ten_days_ago,
+                duration=5,
+            )
+            borrow.returned_at = timezone.now()
+            borrow.save()
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        response = client.get("/borrows/export/csv/")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(
+            csv.DictReader(StringIO(b"".join(response.streaming_content).decode()))
+        )
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["student__username"], self.students[0].username)
+        client.login(username=self.manager.username, password="salam*123")
+        response = client.get("/delay-penalties/export/ndjson/", data={"search": "B2"})
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["borrow__book__title"], "B2")
+        self.assertEqual(rows[0]["amount"], 6000)
+
     def test_ran_out_book_for_borrow(self):
         """Book can be borrowed as many times as its copies number"""
         book = Book.objects.get(pk=1)
@@ -222,6 +860,25 @@ class BookTestCase(TestCase):
         response = client1.post("/borrows/", data={"book": book.id})
         self.assertEqual(response.status_code, 201)
 
+    def test_out_copies_follow_borrows(self):
+        """Copies out counter is maintained on borrow, return and reconcile"""
+        client1 = APIClient()
+        client1.login(username=self.students[0].username, password="salam*123")
+        client1.post("/borrows/", data={"book": 2})
+        self.assertEqual(Book.objects.get(pk=2).out_copies, 1)
+        response = client1.get("/books/2/")
+        self.assertEqual(response.json()["out_copies"], 1)
+        self.assertTrue(response.json()["is_available"])
+        client2 = APIClient()
+        client2.login(username=self.manager.username, password="salam*123")
+        client2.post("/borrows/1/start/", data={"duration": 5})
+        client2.post("/borrows/1/terminate/")
+        self.assertEqual(Book.objects.get(pk=2).out_copies, 0)
+        Book.objects.filter(pk=2).update(out_copies=2)
+        self.assertFalse(Book.objects.get(pk=2).is_available)
+        call_command("reconcile_out_copies", stdout=StringIO())
+        self.assertEqual(Book.objects.get(pk=2).out_copies, 0)
+
     def test_concurrent_borrow_for_student(self):
         """Student shall not borrow a book before returning the last one"""
         client = APIClient()
@@ -231,6 +888,54 @@ class BookTestCase(TestCase):
         response = client.post("/borrows/", data={"book": 2})
         self.assertEqual(response.status_code, 400)
 
+    def test_student_standing_follows_borrows_and_penalties(self):
+        """Eligibility is read from a standing kept in step with borrows and penalties"""
+        student = self.students[0]
+        client = APIClient()
+        client.login(username=student.username, password="salam*123")
+        self.assertEqual(client.post("/borrows/", data={"book": 1}).status_code, 201)
+        self.assertEqual(StudentStanding.objects.get(pk=student.pk).open_borrows, 1)
+        with self.assertRaises(ValidationError):
+            Borrow(student=student, book_id=2).save()
+        self.assertEqual(client.post("/borrows/", data={"book": 2}).status_code, 400)
+        self.assertEqual(StudentStanding.objects.get(pk=student.pk).open_borrows, 1)
+
+        borrow = Borrow.objects.get(student=student)
+        twenty_days_ago = timezone.now() - timezone.timedelta(days=20)
+        Borrow.objects.filter(pk=borrow.pk).update(
+            borrowed_at=twenty_days_ago, duration=10
+        )
+        manager = APIClient()
+        manager.login(username=self.manager.username, password="salam*123")
+        manager.post(f"/borrows/{borrow.pk}/terminate/")
+        standing = StudentStanding.objects.get(pk=student.pk)
+        self.assertEqual(
+            (standing.open_borrows, standing.unpaid_penalties, standing.unpaid_amount),
+            (0, 1, 11 * 1000),
+        )
+        self.assertEqual(client.post("/borrows/", data={"book": 2}).status_code, 400)
+        penalty = DelayPenalty.objects.get(borrow=borrow)
+        response = manager.patch(
+            f"/delay-penalties/{penalty.pk}/", data={"is_paid": True}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StudentStanding.objects.get(pk=student.pk).unpaid_penalties, 0)
+        self.assertEqual(client.post("/borrows/", data={"book": 2}).status_code, 201)
+        self.assertEqual(StudentStanding.objects.reconcile(), 0)
+        penalty.refresh_from_db()
+        penalty.is_paid = False
+        penalty.save()
+        self.assertEqual(
+            StudentStanding.objects.get(pk=student.pk).unpaid_amount, 11000
+        )
+        Borrow.objects.filter(student=student).delete()
+        standing = StudentStanding.objects.get(pk=student.pk)
+        self.assertEqual(
+            (standing.open_borrows, standing.unpaid_penalties, standing.unpaid_amount),
+            (0, 0, 0),
+        )
+        self.assertEqual(StudentStanding.objects.get(pk=student.pk).open_borrows, 0)
+
     def test_penalty_is_made_on_delay(self):
         """Delays on returning book must generate penalty"""
         twenty_days_ago = timezone.now() - timezone.timedelta(days=20)
@@ -249,6 +954,34 @@ class BookTestCase(TestCase):
         self.assertIsNotNone(borrow.delaypenalty)
         self.assertEqual(borrow.delaypenalty.amount, 11 * 1000)
 
+    def test_delay_penalties_are_applied_in_batch(self):
+        """Overdue open borrows are charged idempotently by the nightly job"""
+        now = timezone.now()
+        for days, student in zip((10, 3), self.students):
+            borrow = Borrow.objects.create(
+                book_id=student.pk, student=student, borrowed_at=now, duration=5
+            )
+            Borrow.objects.filter(pk=borrow.pk).update(
+                borrowed_at=now - timezone.timedelta(days=days)
+            )
+        self.assertEqual(apply_delay_penalties(chunk_size=1), (1, 0))
+        self.assertEqual(apply_delay_penalties(chunk_size=1), (0, 0))
+        penalty = DelayPenalty.objects.get()
+        self.assertEqual(penalty.borrow.student, self.students[0])
+        self.assertEqual(penalty.amount, 6000)
+        tomorrow = now + timezone.timedelta(days=1)
+        self.assertEqual(apply_delay_penalties(now=tomorrow), (0, 1))
+        penalty.refresh_from_db()
+        self.assertEqual(penalty.amount, 7000)
+        stdout = StringIO()
+        call_command("apply_delay_penalties", stdout=stdout)
+        self.assertIn("Created 0 and updated 1 delay penalties", stdout.getvalue())
+        client = APIClient()
+        client.login(username=self.manager.username, password="salam*123")
+        client.post(f"/borrows/{penalty.borrow_id}/terminate/")
+        penalty.refresh_from_db()
+        self.assertEqual(penalty.amount, 6000)
+
     def test_unpaid_penalty_prevents_borrow(self):
         """Student must pay penalty before borrowing another book"""
         ten_days_ago = timezone.now() - timezone.timedelta(days=10)
@@ -266,3 +999,420 @@ class BookTestCase(TestCase):
         client2.login(username=self.students[0].username, password="salam*123")
         response = client2.post("/borrows/", data={"book": 5})
         self.assertEqual(response.status_code, 400)
+
+    def test_explain_queries(self):
+        """Canonical queries shall be answered from indexes"""
+        stdout = StringIO()
+        call_command("explain_queries", stdout=stdout)
+        self.assertIn("open borrows of a book: OK", stdout.getvalue())
+        plan = explain(Borrow.objects.filter(duration=14))
+        self.assertEqual(sequential_scans(plan), ["books_borrow"])
+
+    @override_settings(BORROW_FEED_POLL_INTERVAL=0.05)
+    def test_borrow_feed(self):
+        """Borrow and penalty changes shall be followed from the feed"""
+        student = APIClient()
+        student.login(username=self.students[0].username, password="salam*123")
+        manager = APIClient()
+        manager.login(username=self.manager.username, password="salam*123")
+        borrow = student.post("/borrows/", data={"book": 1}).json()
+        manager.post(f"/borrows/{borrow['id']}/start/", data={"duration": 5})
+        Borrow.objects.filter(pk=borrow["id"]).update(
+            borrowed_at=timezone.now() - timezone.timedelta(days=10)
+        )
+        apply_delay_penalties()
+        manager.post(f"/borrows/{borrow['id']}/terminate/")
+        other = Borrow.objects.create(book_id=2, student=self.students[1])
+        other.delete()
+
+        response = manager.get("/borrows/feed/")
+        events = response.json()["results"]
+        self.assertEqual(
+            [event["kind"] for event in events],
+            [
+                "requested",
+                "started",
+                "penalized",
+                "returned",
+                "requested",
+                "deleted",
+            ],
+        )
+        self.assertEqual(events[2]["data"], {"amount": 6000, "is_paid": False})
+        self.assertIsNotNone(events[3]["data"]["returned_at"])
+        last = events[-1]["position"]
+        self.assertEqual(response.json()["last"], last)
+        response = student.get(f"/borrows/feed/?after={events[0]['position']}&limit=2")
+        self.assertEqual(
+            [event["kind"] for event in response.json()["results"]],
+            ["started", "penalized"],
+        )
+        response = student.get(response.json()["next"])
+        self.assertEqual(len(response.json()["results"]), 1)
+
+        # An event committed after later ones were read comes after them.
+        BorrowEvent.objects.filter(pk=events[1]["id"]).update(position=None)
+        response = manager.get(f"/borrows/feed/?after={last}")
+        self.assertEqual(
+            [(event["id"], event["kind"]) for event in response.json()["results"]],
+            [(events[1]["id"], "started")],
+        )
+        self.assertGreater(response.json()["last"], last)
+        last = response.json()["last"]
+
+        started = time.monotonic()
+        response = manager.get(f"/async/borrows/feed/?after={last}&wait=0.2")
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(response.json()["results"], [])
+        self.assertEqual(response.json()["last"], last)
+        response = student.get("/async/borrows/feed/")
+        self.assertEqual(len(response.json()["results"]), 4)
+        self.assertEqual(student.get("/borrows/feed/?wait=-1").status_code, 400)
+        self.assertEqual(student.get("/async/borrows/feed/?wait=-1").status_code, 400)
+        self.assertEqual(APIClient().get("/borrows/feed/").status_code, 401)
+        self.assertEqual(APIClient().get("/async/borrows/feed/").status_code, 401)
+
+    def test_book_availability(self):
+        """Availability of many books shall be answered at once, and filtered on"""
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        client.post("/borrows/", data={"book": 1})
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/books/availability/?ids=1,2,999")
+        self.assertEqual(
+            len([query for query in queries if '"books_book"' in query["sql"]]), 1
+        )
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {"id": 1, "is_available": False, "available_copies": 0},
+                {"id": 2, "is_available": True, "available_copies": 2},
+            ],
+        )
+        self.assertEqual(client.get("/books/availability/?ids=1,a").status_code, 400)
+        self.assertEqual(client.get("/books/availability/").status_code, 400)
+        response = client.get("/books/?available=false")
+        self.assertEqual([book["id"] for book in response.json()["results"]], [1])
+        response = client.get("/books/?available=true")
+        self.assertEqual(response.json()["count"], Book.objects.count() - 1)
+
+    def test_book_facets(self):
+        """Facets shall count books per tag and type, incrementally when unfiltered"""
+        client = APIClient()
+        client.login(username=self.students[0].username, password="salam*123")
+        response = client.get("/books/facets/")
+        self.assertEqual(
+            [(facet["type"], facet["count"]) for facet in response.json()["types"]],
+            [("R", 3), ("A", 1), ("T", 1), ("O", 0)],
+        )
+        self.assertEqual(
+            [(facet["name"], facet["count"]) for facet in response.json()["tags"]],
+            [("General", 3), ("Scientific", 3)],
+        )
+        response = client.get("/books/facets/?type__in=R")
+        self.assertEqual(
+            [(facet["name"], facet["count"]) for facet in response.json()["tags"]],
+            [("Scientific", 3), ("General", 2)],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.get(pk=1).tags.add(*self.tags)
+            self.tags[0].book_set.remove(Book.objects.get(pk=4))
+            book = Book.objects.get(pk=2)
+            book.type = Book.TYPE_OTHER
+            book.save()
+            Book.objects.get(pk=5).delete()
+            Tag.objects.create(name="New").book_set.add(book)
+            Book.objects.get(pk=3).tags.clear()
+            # Removing links which do not exist counts nothing.
+            Book.objects.get(pk=3).tags.remove(*self.tags)
+            self.tags[1].book_set.remove(Book.objects.get(pk=3))
+        with self.assertNumQueries(1):
+            cached = facets.count_books()
+        self.assertEqual(cached, facets.count_books(Book.objects.all()))
+        self.assertEqual(
+            [(facet["name"], facet["count"]) for facet in cached["tags"]],
+            [("General", 2), ("Scientific", 2), ("New", 1)],
+        )
+
+    def test_admin_changelists(self):
+        """Admin changelists shall cost the same number of queries whatever the rows"""
+        admin = User.objects.create_superuser("admin", password="salam*123")
+        self.client.force_login(admin)
+        now = timezone.now()
+        urls = (
+            "/admin/books/book/",
+            "/admin/books/borrow/",
+            "/admin/books/delaypenalty/",
+            f"/admin/books/borrow/?requested_at__year={now.year}",
+        )
+
+        def borrow(book_id, student):
+            Borrow.objects.create(
+                book_id=book_id,
+                student=student,
+                borrowed_at=now - timezone.timedelta(days=10),
+                duration=5,
+                returned_at=now,
+            )
+            penalty = DelayPenalty.objects.get(is_paid=False)
+            penalty.is_paid = True
+            penalty.save()
+
+        borrow(1, self.students[0])
+        queries = {}
+        for url in urls:
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            queries[url] = len(captured)
+        for book_id in range(2, 6):
+            for student in self.students:
+                borrow(book_id, student)
+        for url in urls:
+            with self.assertNumQueries(queries[url]):
+                self.client.get(url)
+        response = self.client.get("/admin/books/borrow/")
+        self.assertContains(response, f"?requested_at__year={now.year}")
+        self.assertIsInstance(response.context["cl"].queryset, DateRangeQuerySetMixin)
+
+        paginator = EstimatedCountPaginator(Borrow.objects.order_by("pk"), 2)
+        paginator.exact_count_limit = 3
+        self.assertEqual(paginator.count, Borrow.objects.order_by("-pk")[0].pk)
+        paginator = EstimatedCountPaginator(
+            Borrow.objects.filter(student=self.students[0]).order_by("pk"), 2
+        )
+        paginator.exact_count_limit = 3
+        self.assertEqual(paginator.count, 3)
+
+    def test_borrow_archive(self):
+        """Borrows returned long ago shall move to the archive and stay in the history"""
+        now = timezone.now()
+        long_ago = now - timezone.timedelta(days=730)
+
+        def borrow(book_id, student, returned_at, late=False):
+            borrowed_at = returned_at - timezone.timedelta(days=10 if late else 1)
+            borrow = Borrow.objects.create(
+                book_id=book_id,
+                student=student,
+                borrowed_at=borrowed_at,
+                duration=5,
+                returned_at=returned_at,
+            )
+            Borrow.objects.filter(pk=borrow.pk).update(requested_at=borrowed_at)
+            return borrow.pk
+
+        paid = borrow(1, self.students[0], long_ago, late=True)
+        penalty = DelayPenalty.objects.get(borrow=paid)
+        penalty.is_paid = True
+        penalty.save()
+        clean = borrow(2, self.students[0], long_ago)
+        recent = borrow(3, self.students[0], now)
+        other = borrow(4, self.students[1], long_ago)
+        unpaid = borrow(5, self.students[0], long_ago, late=True)
+
+        call_command(
+            "archive_borrows", batch_size=1, pause=0, limit=2, stdout=StringIO()
+        )
+        self.assertEqual(
+            set(ArchivedBorrow.objects.values_list("pk", flat=True)), {paid, clean}
+        )
+        call_command("archive_borrows", pause=0, stdout=StringIO())
+        self.assertEqual(
+            set(ArchivedBorrow.objects.values_list("pk", flat=True)),
+            {paid, clean, other},
+        )
+        self.assertEqual(
+            set(Borrow.objects.values_list("pk", flat=True)), {recent, unpaid}
+        )
+        self.assertEqual(ArchivedDelayPenalty.objects.get().borrow_id, paid)
+        self.assertEqual(DelayPenalty.objects.get().borrow_id, unpaid)
+        self.assertFalse(BorrowEvent.objects.filter(kind="deleted").exists())
+
+        student = APIClient()
+        student.login(username=self.students[0].username, password="salam*123")
+        response = student.get(f"/borrows/history/?student={self.students[1].pk}")
+        self.assertEqual(response.json()["count"], 4)
+        rows = {row["id"]: row for row in response.json()["results"]}
+        self.assertEqual(
+            {pk: row["archived"] for pk, row in rows.items()},
+            {paid: True, clean: True, recent: False, unpaid: False},
+        )
+        self.assertEqual(response.json()["results"][0]["id"], recent)
+        self.assertTrue(rows[paid]["penalty_is_paid"])
+        self.assertFalse(rows[unpaid]["penalty_is_paid"])
+        self.assertIsNone(rows[clean]["penalty_amount"])
+        manager = APIClient()
+        manager.login(username=self.manager.username, password="salam*123")
+        response = manager.get(f"/borrows/history/?student={self.students[1].pk}")
+        self.assertEqual([row["id"] for row in response.json()["results"]], [other])
+        self.assertEqual(APIClient().get("/borrows/history/").status_code, 401)
+
+    def test_circulation_stats(self):
+        """Circulation rollups shall follow borrows and penalties as a rebuild would count them"""
+        now = timezone.now()
+
+        def rollups():
+            return {
+                (stat.dimension, stat.month, stat.key): (
+                    stat.borrows,
+                    stat.penalty_revenue,
+                )
+                for stat in CirculationStat.objects.all()
+                if stat.borrows or stat.penalty_revenue
+            }
+
+        def assert_rebuilt():
+            circulation.update()
+            counted = rollups()
+            circulation.rebuild()
+            self.assertEqual(counted, rollups())
+
+        late = Borrow.objects.create(
+            book_id=4,
+            student=self.students[0],
+            borrowed_at=now - timezone.timedelta(days=10),
+            duration=5,
+            returned_at=now,
+        )
+        penalty = DelayPenalty.objects.get(borrow=late)
+        penalty.is_paid = True
+        penalty.save()
+        old = Borrow.objects.create(
+            book_id=2,
+            student=self.students[0],
+            borrowed_at=now - timezone.timedelta(days=90),
+            duration=30,
+            returned_at=now - timezone.timedelta(days=80),
+        )
+        student = APIClient()
+        student.login(username=self.students[1].username, password="salam*123")
+        manager = APIClient()
+        manager.login(username=self.manager.username, password="salam*123")
+        borrow = student.post("/borrows/", data={"book": 4}).json()
+        manager.post(f"/borrows/{borrow['id']}/start/", data={"duration": 5})
+        assert_rebuilt()
+        month = CirculationStat.month_of(late.borrowed_at)
+        self.assertEqual(
+            rollups()[CirculationStat.DIMENSION_TYPE, month, "R"][1], penalty.amount
+        )
+
+        call_command("archive_borrows", months=1, pause=0, stdout=StringIO())
+        self.assertFalse(Borrow.objects.filter(pk=old.pk).exists())
+        assert_rebuilt()
+        late.delete()
+        assert_rebuilt()
+        Borrow.objects.filter(pk=borrow["id"]).get().delete()
+        circulation.update()
+        self.assertEqual(
+            set(rollups()),
+            {
+                (dimension, CirculationStat.month_of(old.borrowed_at), key)
+                for dimension, key in (
+                    ("total", ""),
+                    ("type", "R"),
+                    ("tag", str(self.tags[0].pk)),
+                    ("book", "2"),
+                )
+            },
+        )
+
+        response = manager.get(
+            "/circulation-stats/?dimension=book"
+            f"&month__lte={CirculationStat.month_of(old.borrowed_at)}"
+        )
+        self.assertEqual(
+            [(row["key"], row["borrows"]) for row in response.json()["results"]],
+            [("2", 1)],
+        )
+        Borrow.objects.create(
+            book_id=5,
+            student=self.students[0],
+            borrowed_at=now,
+            duration=5,
+            returned_at=now,
+        )
+        call_command("update_circulation_stats", stdout=StringIO())
+        response = manager.get(
+            f"/circulation-stats/top-books/?month__gte={CirculationStat.month_of(now)}"
+        )
+        self.assertEqual(
+            response.json()["results"],
+            [{"book": 5, "title": "B5", "borrows": 1, "penalty_revenue": 0}],
+        )
+        self.assertEqual(student.get("/circulation-stats/").status_code, 403)
+
+        # Changes go to the tags a book was counted under, even once retagged.
+        Book.objects.get(pk=5).tags.set([self.tags[0]])
+        Borrow.objects.get(book=5).delete()
+        circulation.update()
+        self.assertEqual(
+            set(rollups()),
+            {
+                (dimension, CirculationStat.month_of(old.borrowed_at), key)
+                for dimension, key in (
+                    ("total", ""),
+                    ("type", "R"),
+                    ("tag", str(self.tags[0].pk)),
+                    ("book", "2"),
+                )
+            },
+        )
+        # Archived borrows go along with their book, and out of the rollups.
+        Book.objects.get(pk=2).delete()
+        circulation.update()
+        self.assertEqual(rollups(), {})
+        assert_rebuilt()
+
+
+class ReplicaTestCase(TransactionTestCase):
+    # The replica mirrors the test database through a connection of its own,
+    # which only sees committed rows.
+    databases = {"default", "replica"}
+    reset_sequences = True
+
+    create_groups = BookTestCase.create_groups
+    create_users = BookTestCase.create_users
+    create_books = BookTestCase.create_books
+    setUp = BookTestCase.setUp
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_replica_reads(self):
+        """Catalog reads shall come from replicas, except right after a write"""
+        manager = APIClient()
+        manager.login(username=self.manager.username, password="salam*123")
+        student = APIClient()
+        student.login(username=self.students[0].username, password="salam*123")
+        book = Book.objects.order_by("pk")[3].pk
+
+        def read(client, url):
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                with CaptureQueriesContext(connection) as primary:
+                    response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return response, len(replica), len(primary)
+
+        for url in ("/books/", "/tags/", f"/books/{book}/related/"):
+            response, replica, primary = read(student, url)
+            self.assertGreater(replica, 0)
+            self.assertEqual(response["X-Cache"], "MISS")
+            # Not cached from the replica.
+            self.assertEqual(read(student, url)[0]["X-Cache"], "MISS")
+        book_queries = read(student, "/books/")[2]
+
+        borrow = student.post("/borrows/", data={"book": book}).json()
+        response, replica, primary = read(student, "/books/")
+        self.assertEqual((replica, response["X-Cache"]), (0, "MISS"))
+        self.assertGreater(primary, book_queries)
+        self.assertGreater(read(manager, "/tags/")[1], 0)
+        manager.post(f"/borrows/{borrow['id']}/start/", data={"duration": 5})
+        self.assertEqual(read(manager, "/tags/")[1], 0)
+        self.assertEqual(read(student, "/books/")[0]["X-Cache"], "HIT")
+        manager.post(f"/borrows/{borrow['id']}/terminate/")
+        self.assertEqual(read(manager, f"/books/{book}/related/")[1], 0)
+        self.assertEqual(student.get("/borrows/").status_code, 200)
+
+    def test_replica_pin_cache_check(self):
+        """Replicas shall be reported while their pins are kept per process"""
+        self.assertEqual(checks.check_replica_pin_cache(None), [])
+        with override_settings(DATABASE_REPLICAS=["replica"]):
+            errors = checks.check_replica_pin_cache(None)
+        self.assertEqual([error.id for error in errors], ["books.W001"])
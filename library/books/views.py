@@ -1,46 +1,164 @@
+from django.db import transaction
 from django.utils import timezone
-from django.utils.decorators import method_decorator
 from django.utils.translation import gettext as _
-from django.views.decorators.cache import cache_page
-from rest_framework import viewsets, mixins
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from library.books.models import Tag, Book, Borrow, DelayPenalty
+from library.books.filters import BookFilterSet, BookSearchFilter
+from library.books import cache as catalog_cache
+from library.books import archive, circulation, facets, feed
+from library.books.mixins import (
+    CatalogCacheMixin,
+    ConditionalGetMixin,
+    ExportMixin,
+    QueryPlanMixin,
+    ReplicaReadMixin,
+    ValuesListMixin,
+)
+from library.books.models import (
+    Tag,
+    Book,
+    Borrow,
+    CirculationStat,
+    DelayPenalty,
+)
 from library.books.serializers import (
     TagSerializer,
+    BookAvailabilitySerializer,
     BookSerializer,
+    BookValuesSerializer,
     DelayPenaltySerializer,
+    BorrowFeedSerializer,
+    BorrowHistorySerializer,
     BorrowSerializer,
+    BorrowValuesSerializer,
+    CirculationStatSerializer,
+    TopBooksSerializer,
 )
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(
+    ReplicaReadMixin,
+    ConditionalGetMixin,
+    CatalogCacheMixin,
+    QueryPlanMixin,
+    viewsets.ModelViewSet,
+):
+    cache_namespace = catalog_cache.TAGS
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     search_fields = ("name",)
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(
+    ReplicaReadMixin,
+    ConditionalGetMixin,
+    CatalogCacheMixin,
+    ValuesListMixin,
+    QueryPlanMixin,
+    viewsets.ModelViewSet,
+):
+    cache_namespace = catalog_cache.BOOKS
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    values_serializer_class = BookValuesSerializer
+    filter_backends = (DjangoFilterBackend, BookSearchFilter)
     search_fields = ("title", "isbn", "authors")
-    filterset_fields = {
-        "type": ["in"],
-        "tags": ["in"],
-    }
+    cursor_ordering = ("id",)
+    filterset_class = BookFilterSet
+
+    def get_cache_namespace(self):
+        if self.action == "get_availability" or self.request.query_params.get(
+            "available"
+        ):
+            return catalog_cache.AVAILABILITY
+        return self.cache_namespace
+
+    def refresh_cached(self, data):
+        """Overlay the current availability of the cached books.
+
+        Borrows change it without invalidating the cached books, and bump
+        their modification dates, so the validators are refreshed too.
+        """
+        if self.action not in ("list", "retrieve", "get_related_books"):
+            return
+        rows = [data] if self.action == "retrieve" else data["results"]
+        books = Book.objects.filter(pk__in=[row["id"] for row in rows]).values_list(
+            "pk", "copies", "out_copies", "updated_at"
+        )
+        books = {pk: values for pk, *values in books}
+        updated_field = BookSerializer().fields["updated_at"]
+        for row in rows:
+            if row["id"] in books:
+                copies, out_copies, updated_at = books[row["id"]]
+                row["out_copies"] = out_copies
+                row["is_available"] = out_copies < copies
+                row["updated_at"] = updated_field.to_representation(updated_at)
+        if self.validators and books:
+            modified = max(
+                updated_at for copies, out_copies, updated_at in books.values()
+            )
+            self.validators = (modified, self.validators[1])
+
+    @action(methods=("GET",), detail=False, url_path="facets", url_name="facets")
+    def get_facets(self, request, *args, **kwargs):
+        return self.cached_response(self.list_facets, request, *args, **kwargs)
+
+    def list_facets(self, request, *args, **kwargs):
+        """Count matching books per tag and per type, from cached counts when unfiltered."""
+        filters = (*self.filterset_class.base_filters, api_settings.SEARCH_PARAM)
+        if any(request.query_params.get(name) for name in filters):
+            queryset = self.filter_queryset(Book.objects.all())
+            return Response(facets.count_books(queryset))
+        return Response(facets.count_books())
+
+    @action(
+        methods=("GET",), detail=False, url_path="availability", url_name="availability"
+    )
+    def get_availability(self, request, *args, **kwargs):
+        return self.cached_response(self.list_availability, request, *args, **kwargs)
+
+    def list_availability(self, request, *args, **kwargs):
+        params = BookAvailabilitySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        books = Book.objects.filter(pk__in=params.validated_data["ids"]).order_by("pk")
+        return Response(
+            {
+                "results": [
+                    {
+                        "id": pk,
+                        "is_available": out_copies < copies,
+                        "available_copies": max(copies - out_copies, 0),
+                    }
+                    for pk, copies, out_copies in books.values_list(
+                        "pk", "copies", "out_copies"
+                    )
+                ]
+            }
+        )
 
-    @method_decorator(cache_page(30 * 60))
     @action(methods=("GET",), detail=True, url_path="related", url_name="related")
     def get_related_books(self, request, *args, **kwargs):
+        return self.cached_response(self.list_related_books, request, *args, **kwargs)
+
+    def list_related_books(self, request, *args, **kwargs):
         book = self.get_object()
-        page = self.paginate_queryset(book.related_books)
+        page = self.paginate_queryset(self.plan_queryset(book.related_books))
         serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
 
 
 class BorrowViewSet(
+    ConditionalGetMixin,
+    ValuesListMixin,
+    QueryPlanMixin,
+    ExportMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
@@ -48,15 +166,29 @@ class BorrowViewSet(
 ):
     queryset = Borrow.objects.all()
     serializer_class = BorrowSerializer
+    values_serializer_class = BorrowValuesSerializer
     search_fields = ("book__title", "student__username")
+    cursor_ordering = ("-requested_at", "-id")
+    export_fields = (
+        "id",
+        "student",
+        "student__username",
+        "book",
+        "book__title",
+        "requested_at",
+        "borrowed_at",
+        "duration",
+        "returned_at",
+    )
     filterset_fields = {
         "requested_at": ["lte", "gte"],
     }
 
     def get_queryset(self):
+        queryset = super(BorrowViewSet, self).get_queryset()
         if self.request.user.has_perm("books.change_borrow"):
-            return self.queryset
-        return self.queryset.filter(student=self.request.user)
+            return queryset
+        return queryset.filter(student=self.request.user)
 
     def perform_create(self, serializer):
         serializer.save(student=self.request.user)
@@ -76,6 +208,29 @@ class BorrowViewSet(
         borrow.save()
         return Response(self.get_serializer(borrow).data)
 
+    @action(methods=("GET",), detail=False, url_path="feed", url_name="feed")
+    def get_feed(self, request, *args, **kwargs):
+        """Events after the ``after`` one; ``wait`` is only served by the async feed."""
+        params = BorrowFeedSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        after = params.validated_data["after"]
+        student = None
+        if not request.user.has_perm("books.change_borrow"):
+            student = request.user.pk
+        events = feed.read(after, params.validated_data["limit"], student)
+        return Response(feed.page(request.build_absolute_uri(), after, events))
+
+    @action(methods=("GET",), detail=False, url_path="history", url_name="history")
+    def get_history(self, request, *args, **kwargs):
+        """Live and archived borrows of the user, or of ``student`` for managers."""
+        params = BorrowHistorySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        student = request.user.pk
+        if request.user.has_perm("books.change_borrow"):
+            student = params.validated_data.get("student", student)
+        page = self.paginate_queryset(archive.history(student))
+        return self.get_paginated_response(page)
+
     def get_serializer_class(self):
         if self.action == "create":
             self.serializer_class.Meta.read_only_fields = (
@@ -103,13 +258,14 @@ class BorrowViewSet(
 
     def check_permissions(self, request):
         if (
-            self.action
-            in (
-                "start_borrow",
-                "terminate_borrow",
-            )
-            and not request.user.has_perm("books.change_borrow")
+            self.action in ("get_feed", "get_history")
+            and not request.user.is_authenticated
         ):
+            self.permission_denied(request)
+        if self.action in (
+            "start_borrow",
+            "terminate_borrow",
+        ) and not request.user.has_perm("books.change_borrow"):
             raise PermissionDenied(_("You may not make this change."))
 
     def check_object_permissions(self, request, obj):
@@ -123,6 +279,8 @@ class BorrowViewSet(
 
 
 class DelayPenaltyViewSet(
+    QueryPlanMixin,
+    ExportMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -131,11 +289,73 @@ class DelayPenaltyViewSet(
     queryset = DelayPenalty.objects.all()
     serializer_class = DelayPenaltySerializer
     search_fields = ("borrow__book__title", "borrow__student__username")
+    cursor_ordering = ("id",)
+    export_fields = (
+        "id",
+        "borrow",
+        "borrow__student__username",
+        "borrow__book__title",
+        "amount",
+        "is_paid",
+    )
     filterset_fields = {
         "is_paid": ["exact"],
     }
 
     def get_queryset(self):
+        queryset = super(DelayPenaltyViewSet, self).get_queryset()
         if self.request.user.has_perm("books.change_delaypenalty"):
-            return self.queryset
-        return self.queryset.filter(borrow__student=self.request.user)
+            return queryset
+        return queryset.filter(borrow__student=self.request.user)
+
+
+class CirculationStatViewSet(
+    ReplicaReadMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    queryset = CirculationStat.objects.order_by("dimension", "month", "key")
+    serializer_class = CirculationStatSerializer
+    filterset_fields = {
+        "dimension": ["exact"],
+        "key": ["exact", "in"],
+        "month": ["gte", "lte"],
+    }
+
+    @action(methods=("GET",), detail=False, url_path="top-books", url_name="top-books")
+    def get_top_books(self, request, *args, **kwargs):
+        """Most borrowed books over the filtered months."""
+        params = TopBooksSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        stats = self.filter_queryset(self.get_queryset())
+        return Response(
+            {"results": circulation.top_books(stats, params.validated_data["limit"])}
+        )
+
+    def check_permissions(self, request):
+        super(CirculationStatViewSet, self).check_permissions(request)
+        if not request.user.has_perm("books.view_circulationstat"):
+            raise PermissionDenied(_("You may not see circulation statistics."))
+
+
+class TokenViewSet(viewsets.ViewSet):
+    permission_classes = (IsAuthenticated,)
+
+    def create(self, request, *args, **kwargs):
+        token, created = Token.objects.get_or_create(user=request.user)
+        return Response(
+            {"token": token.key},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    @action(methods=("POST",), detail=False, url_path="rotate", url_name="rotate")
+    def rotate_token(self, request, *args, **kwargs):
+        with transaction.atomic():
+            Token.objects.filter(user=request.user).delete()
+            token = Token.objects.create(user=request.user)
+        return Response({"token": token.key}, status=status.HTTP_201_CREATED)
+
+    @action(methods=("POST",), detail=False, url_path="revoke", url_name="revoke")
+    def revoke_token(self, request, *args, **kwargs):
+        Token.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -36,11 +39,14 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "rest_framework",
+    "rest_framework.authtoken",
     "django_filters",
     "library.books",
 ]
 
 MIDDLEWARE = [
+    "library.books.metrics.MetricsMiddleware",
+    "library.books.replicas.ReplicaPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
@@ -78,9 +84,64 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+    },
+    # Stands in for a read replica of "default", see DATABASE_REPLICAS below.
+    # Tests read it from the test database of "default".
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    },
+}
+
+DATABASE_ROUTERS = ["library.books.replicas.ReplicaRouter"]
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+
+def cache_from_url(url, location):
+    """Settings of the cache at ``url`` (``redis://`` or ``memcached://``), if any.
+
+    Without a URL, a local memory cache is used. Such caches are kept per
+    process, so they are only safe when serving with a single worker.
+    """
+    if not url:
+        return {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": location,
+        }
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        backend = "django.core.cache.backends.redis.RedisCache"
+    elif url.startswith("memcached://"):
+        backend = "django.core.cache.backends.memcached.PyMemcacheCache"
+        url = url[len("memcached://") :]
+    else:
+        raise ImproperlyConfigured(f"Unsupported cache URL: {url}")
+    return {"BACKEND": backend, "LOCATION": url, "KEY_PREFIX": location}
+
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Holds catalog responses and their generations, see CATALOG_CACHE below.
+    "catalog": cache_from_url(os.environ.get("CATALOG_CACHE_URL"), "catalog"),
+    # Holds verified API tokens and user permissions, see AUTH_CACHE below.
+    "auth": cache_from_url(os.environ.get("AUTH_CACHE_URL"), "auth"),
+    # Holds read-your-writes pins, see DATABASE_REPLICAS below.
+    "replica_pins": cache_from_url(
+        os.environ.get("DATABASE_REPLICA_PIN_CACHE_URL"), "replica_pins"
+    ),
 }
 
+# Authentication backends
+# https://docs.djangoproject.com/en/3.2/topics/auth/customizing/#specifying-authentication-backends
+
+AUTHENTICATION_BACKENDS = [
+    "library.books.authentication.CachedPermissionBackend",
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -130,7 +191,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # https://www.django-rest-framework.org/api-guide/settings/
 
 REST_FRAMEWORK = {
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    "DEFAULT_PAGINATION_CLASS": "library.books.pagination.LibraryPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -141,8 +202,51 @@ REST_FRAMEWORK = {
         "rest_framework.filters.SearchFilter",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
+        "library.books.authentication.CachedTokenAuthentication",
         "rest_framework.authentication.BasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-
     ],
 }
+
+# Library settings
+
+# Number of related books kept per book in the precomputed similarity index
+RELATED_BOOKS_INDEX_SIZE = 100
+
+# Dotted path of the book search backend, see library/books/search.py
+BOOK_SEARCH_BACKEND = "library.books.search.TrigramSearchBackend"
+
+# Fraction of the query trigrams a book must contain to be a search match
+BOOK_SEARCH_MIN_SIMILARITY = 0.6
+
+# Cache alias and timeout (in seconds) of catalog responses. The cache must be
+# shared by every worker, so that changes made in one invalidate the others
+CATALOG_CACHE = "catalog"
+CATALOG_CACHE_TIMEOUT = 30 * 60
+
+# Cache alias and timeouts (in seconds) of verified API tokens and user permissions.
+# Revocations only reach other workers through a shared cache; with a cache kept
+# per process, both are cached for AUTH_LOCAL_CACHE_TIMEOUT at most
+AUTH_CACHE = "auth"
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+AUTH_PERMISSIONS_CACHE_TIMEOUT = 5 * 60
+AUTH_LOCAL_CACHE_TIMEOUT = 5
+
+# Record per-route request metrics, exposed in the Prometheus format at /metrics
+METRICS_ENABLED = False
+
+# Database aliases the book and tag endpoints read from, how long (in seconds)
+# users read from "default" again after writing, and the cache alias keeping
+# these pins, which must be shared by every worker
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_PIN_TIMEOUT = 10
+DATABASE_REPLICA_PIN_CACHE = "replica_pins"
+
+# Longest wait (in seconds) of async borrow feed requests, and how often they
+# look for new events
+BORROW_FEED_MAX_WAIT = 30
+BORROW_FEED_POLL_INTERVAL = 0.5
+
+# Borrows returned more than this many months ago are moved to the archive
+# tables by the archive_borrows command
+BORROW_ARCHIVE_MONTHS = 12
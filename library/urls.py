@@ -16,9 +16,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from library.books import async_urls
+from library.books.metrics import metrics_view
 from library.books.routers import router
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
+    path("async/", include((async_urls.urlpatterns, "async"))),
     path("", include((router.urls, "api")))
 ]